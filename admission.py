@@ -0,0 +1,171 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, jsonify, request
+
+from auth import auth_needed, get_request_token, token_cache
+
+
+# Ограничение частоты запросов по алгоритму token bucket: у каждого клиента на каждом end-point'е
+# есть "ведро" на burst жетонов, которое пополняется со скоростью rate жетонов в секунду,
+# каждый запрос забирает один жетон. Ведра хранятся в памяти процесса, поэтому при нескольких
+# рабочих процессах лимит действует в каждом процессе отдельно. Ведер не больше max_clients,
+# вытесняются давно не использованные - к этому времени такое ведро обычно уже снова полное
+class RateLimiter:
+    def __init__(self, max_clients=100000):
+        self.max_clients = max_clients
+        self.allowed = 0
+        self.limited = 0
+        # end-point -> сколько запросов отклонено
+        self.limited_by_endpoint = {}
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Возвращает 0, если жетон есть и запрос можно выполнять,
+    # иначе - через сколько секунд появится следующий жетон
+    def take(self, endpoint, client, rate, burst):
+        key = (endpoint, client)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+                self.allowed += 1
+            else:
+                wait = (1 - tokens) / rate
+                self.limited += 1
+                self.limited_by_endpoint[endpoint] = self.limited_by_endpoint.get(endpoint, 0) + 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self):
+        with self._lock:
+            result = {"allowed": self.allowed, "limited": self.limited, "clients": len(self._buckets)}
+            for endpoint, count in self.limited_by_endpoint.items():
+                result['limited_' + endpoint.replace('.', '_')] = count
+            return result
+
+
+# Ограничение числа запросов, которые одновременно работают с базой. Запрос ждет свободного
+# места не дольше queue_timeout секунд, после чего получает 503: при всплеске нагрузки лишние
+# запросы сразу получают отказ, а не ждут соединения из пула DB_POOL_TIMEOUT секунд,
+# занимая потоки сервера, пока все end-point'ы не встанут разом
+class AdmissionControl:
+    def __init__(self, max_in_flight=15, queue_timeout=0.25):
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+        self.configure(max_in_flight, queue_timeout)
+
+    def configure(self, max_in_flight, queue_timeout):
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+
+    # True - запрос можно выполнять, после него обязательно нужен release
+    def acquire(self):
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            with self._lock:
+                self.queued += 1
+            if not slots.acquire(timeout=self.queue_timeout):
+                with self._lock:
+                    self.shed += 1
+                return False
+        with self._lock:
+            self.admitted += 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        g.admission_slots = slots
+        return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        # место возвращается в тот семафор, из которого было взято, даже если после
+        # этого лимит поменяли через configure
+        g.pop('admission_slots').release()
+
+    def stats(self):
+        with self._lock:
+            return {"admitted": self.admitted, "queued": self.queued, "shed": self.shed,
+                    "in_flight": self.in_flight, "peak": self.peak, "max_in_flight": self.max_in_flight}
+
+
+rate_limiter = RateLimiter()
+admission = AdmissionControl()
+
+
+# Клиент для лимита: токен на end-point'ах с авторизацией, если токен уже проверен
+# (есть в кэше токенов), иначе IP адрес. Непроверенный токен ключом быть не может:
+# иначе каждый новый выдуманный токен получал бы свое ведро и запрос в базу.
+# За прокси адрес клиента нужно восстанавливать через werkzeug ProxyFix
+def client_key(view):
+    token = get_request_token()
+    if token and auth_needed(view, request.method) and token_cache.contains(token):
+        return 'token:' + token
+    return 'ip:' + str(request.remote_addr)
+
+
+def too_many_requests(wait):
+    response = jsonify({"message": "Too many requests", "code": "429"})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+    return response
+
+
+def service_busy(retry_after):
+    response = jsonify({"message": "Server is busy", "code": "503"})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+# Подключение к приложению: сначала проверяется лимит частоты (RATE_LIMITS по end-point'ам,
+# RATE_LIMIT_DEFAULT для остальных, None - без лимита), затем место среди одновременных
+# запросов к базе (ADMISSION_MAX_IN_FLIGHT, по умолчанию - размер пула соединений).
+# End-point'ы из ADMISSION_EXEMPT_ENDPOINTS не работают с базой и места не занимают
+def init_admission(app):
+    rate_limiter.max_clients = app.config['RATE_LIMIT_MAX_CLIENTS']
+    admission.configure(app.config['ADMISSION_MAX_IN_FLIGHT']
+                        or app.config['DB_POOL_SIZE'] + app.config['DB_MAX_OVERFLOW'],
+                        app.config['ADMISSION_QUEUE_TIMEOUT'])
+
+    @app.before_request
+    def admit_request():
+        endpoint = request.endpoint
+        if endpoint is None:
+            return
+
+        if app.config['RATE_LIMIT_ENABLED']:
+            budget = app.config['RATE_LIMITS'].get(endpoint, app.config['RATE_LIMIT_DEFAULT'])
+            if budget:
+                rate, burst = budget
+                wait = rate_limiter.take(endpoint, client_key(app.view_functions.get(endpoint)), rate, burst)
+                if wait:
+                    return too_many_requests(wait)
+
+        if endpoint in app.config['ADMISSION_EXEMPT_ENDPOINTS']:
+            return
+        if not admission.acquire():
+            return service_busy(app.config['ADMISSION_RETRY_AFTER'])
+
+    # teardown вызывается и после ошибок, и после окончания потоковой выдачи
+    @app.teardown_request
+    def release_request(error):
+        if 'admission_slots' in g:
+            admission.release()
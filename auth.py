@@ -0,0 +1,177 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, g, jsonify, request
+
+from models import *
+from routing import use_primary
+
+
+# Кэш токенов в памяти процесса: токен -> (идентификатор пользователя, признак админа).
+# Ограничен по размеру (вытесняются давно не использованные записи) и по времени жизни записи
+class TokenCache:
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            item = self._items.get(token)
+            if item is None or item[1] < time.monotonic():
+                # записи нет или она устарела
+                self._items.pop(token, None)
+                self.misses += 1
+                return None
+            self._items.move_to_end(token)
+            self.hits += 1
+            return item[0]
+
+    # ttl - время жизни записи, если оно должно быть меньше стандартного
+    def set(self, token, value, ttl=None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._items[token] = (value, time.monotonic() + ttl)
+            self._items.move_to_end(token)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    # Есть ли действующая запись, без учета в статистике попаданий
+    def contains(self, token):
+        with self._lock:
+            item = self._items.get(token)
+            return item is not None and item[1] >= time.monotonic()
+
+    def delete(self, token):
+        with self._lock:
+            self._items.pop(token, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._items)}
+
+
+token_cache = TokenCache()
+
+
+# Токен из заголовка Authorization вида "Bearer <токен>"
+def get_request_token():
+    authorization = request.headers.get('Authorization')
+    if authorization is None:
+        return None
+    return authorization[7:]
+
+
+# Поиск пользователя по токену: сначала в кэше, затем одним запросом в базе
+def authenticate(token):
+    auth = token_cache.get(token)
+    if auth is not None:
+        return auth
+
+    query = db.session.query(Token.user_id, Token.expires_at, User.admin)\
+        .join(User, User.id == Token.user_id)\
+        .filter(Token.token == token)
+    row = query.first()
+    if row is None and g.get('replica'):
+        # только что выданного токена может еще не быть в реплике
+        with use_primary():
+            row = query.first()
+    if row is None:
+        return None
+
+    # просроченный токен не действует, удалит его фоновая задача
+    now = datetime.now()
+    if row.expires_at is not None and row.expires_at <= now:
+        return None
+
+    auth = (row.user_id, bool(row.admin))
+    # в кэше токен не должен прожить дольше своего срока действия
+    ttl = None if row.expires_at is None else (row.expires_at - now).total_seconds()
+    token_cache.set(token, auth, ttl)
+    return auth
+
+
+# Выдача нового токена пользователю. Токен действует TOKEN_TTL секунд, у пользователя
+# может быть не больше MAX_TOKENS_PER_USER токенов - самые старые удаляются.
+# Коммит остается за вызывающим кодом
+def issue_token(user_id):
+    now = datetime.now()
+    token = secrets.token_urlsafe(24)
+    db.session.add(Token(user_id, token, now, now + timedelta(seconds=current_app.config['TOKEN_TTL'])))
+    db.session.flush()
+
+    old_tokens = db.session.query(Token.id, Token.token)\
+        .filter(Token.user_id == user_id)\
+        .order_by(Token.id.desc())\
+        .offset(current_app.config['MAX_TOKENS_PER_USER'])\
+        .all()
+    if old_tokens:
+        Token.query.filter(Token.id.in_([row.id for row in old_tokens])).delete(synchronize_session=False)
+        for row in old_tokens:
+            token_cache.delete(row.token)
+
+    return token
+
+
+# Удаление просроченных токенов пачками по batch_size строк, каждая пачка в своей транзакции,
+# чтобы не держать долгие блокировки. За один вызов - не больше max_batches пачек.
+# Возвращает количество удаленных токенов
+def sweep_expired_tokens(batch_size=1000, max_batches=100):
+    deleted = 0
+    for _ in range(max_batches):
+        expired = db.session.query(Token.id)\
+            .filter(Token.expires_at <= datetime.now())\
+            .limit(batch_size)\
+            .subquery()
+        count = Token.query.filter(Token.id.in_(db.session.query(expired.c.id)))\
+            .delete(synchronize_session=False)
+        db.session.commit()
+        deleted += count
+        if count < batch_size:
+            break
+    return deleted
+
+
+# Декоратор для end-point'ов, которым нужен авторизованный пользователь.
+# В methods можно перечислить методы, для которых нужна проверка (по умолчанию - для всех).
+# После проверки в g.user_id и g.admin лежат данные пользователя
+def auth_required(*methods):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if methods and request.method not in methods:
+                return view(*args, **kwargs)
+
+            token = get_request_token()
+            if token is None:
+                return jsonify({"message": "no token", "code": "401"})
+
+            auth = authenticate(token)
+            if auth is None:
+                return jsonify({"message": "no token", "code": "401"})
+
+            g.token = token
+            g.user_id, g.admin = auth
+            return view(*args, **kwargs)
+
+        wrapper.auth_methods = methods
+        return wrapper
+
+    return decorator
+
+
+# Нужна ли авторизация для запроса методом method к end-point'у view
+def auth_needed(view, method):
+    methods = getattr(view, 'auth_methods', None)
+    return methods is not None and (not methods or method in methods)
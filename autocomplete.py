@@ -0,0 +1,207 @@
+import bisect
+import heapq
+import itertools
+import re
+import threading
+from array import array
+
+from models import *
+
+AUTOCOMPLETE_DEFAULT_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+# для таких коротких префиксов подходящих товаров слишком много, чтобы выбирать лучшие
+# при каждом запросе, поэтому лучшие товары для них хранятся готовыми
+SHORT_PREFIX_LENGTH = 2
+
+WORD = re.compile(r'\w+')
+
+
+# Слова для поиска: в нижнем регистре, ё заменяется на е
+def tokenize(text):
+    return WORD.findall((text or '').casefold().replace('ё', 'е'))
+
+
+# Индекс подсказок при наборе текста: отсортированный список слов из названий и издателей
+# товаров, для каждого слова - массив id товаров, в которых оно встречается, упорядоченный
+# от лучшего товара к худшему: сначала товары в наличии, затем по количеству проданных штук
+# и по остатку на складе. Слова с нужным префиксом находятся двоичным поиском, а лучшие
+# товары - слиянием их уже упорядоченных массивов до первых limit товаров.
+# Индекс живет в памяти процесса: он строится при запуске, периодически перестраивается
+# (изменения из других процессов и продажи) и обновляется при изменении товаров в этом процессе
+class AutocompleteIndex:
+    def __init__(self, max_limit=AUTOCOMPLETE_MAX_LIMIT):
+        self.max_limit = max_limit
+        self.ready = False
+        self.terms = []
+        self.postings = []
+        # id товара -> (название, издатель, остаток, ключ сортировки, слова)
+        self.products = {}
+        self.sales = {}
+        self._short = {}
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+
+    # Построение индекса по строкам (id, название, издатель, остаток) и проданным штукам
+    # (id товара -> штук). Новый индекс подменяет старый целиком
+    def build(self, rows, sales):
+        words = {}
+        products = {}
+        for product_id, name, publisher, stock in rows:
+            # одинаковые слова разных товаров хранятся одной строкой
+            product_words = tuple(words.setdefault(term, term) for term in product_terms(name, publisher))
+            products[product_id] = (name, publisher, stock, rank(product_id, stock, sales.get(product_id, 0)),
+                                    product_words)
+
+        postings = {}
+        for product_id in sorted(products, key=lambda product_id: products[product_id][3]):
+            for term in products[product_id][4]:
+                postings.setdefault(term, array('i')).append(product_id)
+
+        terms = sorted(postings)
+        postings = [postings[term] for term in terms]
+        prefixes = {term[:length] for term in terms for length in range(1, min(SHORT_PREFIX_LENGTH, len(term)) + 1)}
+        short = {prefix: self.best_in_range(terms, postings, products, prefix, self.max_limit) for prefix in prefixes}
+
+        with self._lock:
+            self.terms, self.postings, self.products, self.sales = terms, postings, products, sales
+            self._short, self._dirty = short, set()
+            self.ready = True
+
+    # Загрузка товаров и продаж из базы и построение индекса
+    def rebuild(self):
+        with self._build_lock:
+            self.load()
+
+    # Первый запрос ждет построения индекса, если его еще строит фоновая задача
+    def ensure_ready(self):
+        if not self.ready:
+            with self._build_lock:
+                if not self.ready:
+                    self.load()
+
+    def load(self):
+        rows = db.session.query(Product.id, Product.name, Product.publisher, Product.stockCount).all()
+        sales = db.session.query(SalesAggregate.key, SalesAggregate.units)\
+            .filter(SalesAggregate.kind == 'product')\
+            .all()
+        db.session.rollback()
+        self.build(rows, {int(key): units for key, units in sales})
+
+    # Обновление отдельных товаров после их добавления или изменения (данные берутся из базы)
+    def update_products(self, product_ids):
+        if not self.ready:
+            return
+        rows = db.session.query(Product.id, Product.name, Product.publisher, Product.stockCount)\
+            .filter(Product.id.in_(list(product_ids)))\
+            .all()
+        with self._lock:
+            for product_id in product_ids:
+                self.remove(product_id)
+            for row in rows:
+                self.add(*row)
+
+    def add(self, product_id, name, publisher, stock):
+        key = rank(product_id, stock, self.sales.get(product_id, 0))
+        product_words = tuple(product_terms(name, publisher))
+        self.products[product_id] = (name, publisher, stock, key, product_words)
+        for term in product_words:
+            index = bisect.bisect_left(self.terms, term)
+            if index == len(self.terms) or self.terms[index] != term:
+                self.terms.insert(index, term)
+                self.postings.insert(index, array('i'))
+            bisect.insort(self.postings[index], product_id, key=lambda other: self.products[other][3])
+            self.mark_dirty(term)
+
+    def remove(self, product_id):
+        product = self.products.get(product_id)
+        if product is None:
+            return
+        for term in product[4]:
+            index = bisect.bisect_left(self.terms, term)
+            if index < len(self.terms) and self.terms[index] == term:
+                ids = self.postings[index]
+                # ключи сортировки уникальны, поэтому место товара находится двоичным поиском
+                position = bisect.bisect_left(ids, product[3], key=lambda other: self.products[other][3])
+                if position < len(ids) and ids[position] == product_id:
+                    del ids[position]
+                if not ids:
+                    del self.terms[index]
+                    del self.postings[index]
+            self.mark_dirty(term)
+        del self.products[product_id]
+
+    def mark_dirty(self, term):
+        for length in range(1, min(SHORT_PREFIX_LENGTH, len(term)) + 1):
+            self._dirty.add(term[:length])
+
+    # Номера первого и следующего за последним слов, начинающихся с prefix
+    @staticmethod
+    def term_range(terms, prefix):
+        start = bisect.bisect_left(terms, prefix)
+        # все слова с этим префиксом меньше, чем префикс с самым большим символом в конце
+        return start, bisect.bisect_left(terms, prefix + '\U0010ffff', start)
+
+    # Товары со словами, начинающимися с prefix, от лучшего к худшему (без повторов)
+    @classmethod
+    def ranked(cls, terms, postings, products, prefix):
+        start, end = cls.term_range(terms, prefix)
+        seen = set()
+        for product_id in heapq.merge(*postings[start:end], key=lambda product_id: products[product_id][3]):
+            if product_id not in seen:
+                seen.add(product_id)
+                yield product_id
+
+    def best_in_range(self, terms, postings, products, prefix, limit):
+        return list(itertools.islice(self.ranked(terms, postings, products, prefix), limit))
+
+    # Подсказки по введенному тексту: товары, у которых для каждого введенного слова есть
+    # слово в названии или издателе, начинающееся с него. Возвращает не больше limit товаров
+    def suggest(self, text, limit=AUTOCOMPLETE_DEFAULT_LIMIT):
+        tokens = tokenize(text)
+        if not tokens:
+            return []
+        limit = max(1, min(limit, self.max_limit))
+
+        with self._lock:
+            if len(tokens) == 1 and len(tokens[0]) <= SHORT_PREFIX_LENGTH:
+                prefix = tokens[0]
+                if prefix in self._dirty:
+                    self._short[prefix] = self.best_in_range(self.terms, self.postings, self.products,
+                                                             prefix, self.max_limit)
+                    self._dirty.discard(prefix)
+                ids = self._short.get(prefix, [])[:limit]
+            else:
+                # товары перебираются по слову, которое встречается реже всего,
+                # остальные слова проверяются по словам товара
+                tokens.sort(key=self.estimate)
+                others = tokens[1:]
+                ids = []
+                for product_id in self.ranked(self.terms, self.postings, self.products, tokens[0]):
+                    product_words = self.products[product_id][4]
+                    if all(any(word.startswith(token) for word in product_words) for token in others):
+                        ids.append(product_id)
+                        if len(ids) == limit:
+                            break
+
+            return [{"id": product_id, "name": self.products[product_id][0],
+                     "publisher": self.products[product_id][1], "stockCount": self.products[product_id][2]}
+                    for product_id in ids]
+
+    # Сколько товаров (с повторами) подходит под префикс
+    def estimate(self, prefix):
+        start, end = self.term_range(self.terms, prefix)
+        return sum(len(ids) for ids in self.postings[start:end])
+
+
+def product_terms(name, publisher):
+    return dict.fromkeys(tokenize(name) + tokenize(publisher))
+
+
+# Ключ сортировки: меньше - лучше. id делает ключи разных товаров различными
+def rank(product_id, stock, sold):
+    stock = stock or 0
+    return 0 if stock > 0 else 1, -(sold or 0), -stock, product_id
+
+
+autocomplete_index = AutocompleteIndex()
@@ -0,0 +1,28 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+# Периодическая фоновая задача в отдельном потоке. job вызывается внутри контекста
+# приложения раз в interval секунд (с run_first=True - еще и сразу после запуска).
+# Ошибки пишутся в лог и не останавливают поток
+def start_periodic(app, name, interval, job, run_first=False):
+    stop = threading.Event()
+
+    def run_job():
+        with app.app_context():
+            try:
+                job()
+            except Exception:
+                logger.exception('background job %s failed', name)
+
+    def run():
+        if run_first:
+            run_job()
+        while not stop.wait(interval):
+            run_job()
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return stop
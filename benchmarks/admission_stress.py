@@ -0,0 +1,138 @@
+# Проверка лимитов под нагрузкой, которая заведомо их превышает:
+# - POST /login с одного адреса: после запаса лимита - 429 с Retry-After;
+# - GET /cart с двумя токенами: лимит у каждого токена свой, после паузы жетоны возвращаются;
+# - POST /cart с каждый раз новым выдуманным токеном: лимит по адресу, в базу уходят только
+#   запросы в пределах лимита;
+# - POST /search из многих потоков при маленьком ADMISSION_MAX_IN_FLIGHT: лишние запросы
+#   получают 503 с Retry-After, одновременно с базой работает не больше разрешенного.
+# Запуск на базе из конфигурации приложения (лучше тестовой):
+# python -m benchmarks.admission_stress [потоки] [мест для запросов к базе]
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from admission import admission, rate_limiter
+from app import create_app
+from sqlalchemy import event
+
+from auth import authenticate, issue_token
+from metrics import request_metrics
+from models import *
+
+THREAD_REQUESTS = 20
+
+
+def burst(client, count, method, path, **kwargs):
+    return [client.open(path, method=method, **kwargs) for _ in range(count)]
+
+
+def statuses(responses):
+    return Counter(response.status_code for response in responses)
+
+
+def check(results, name, ok, details):
+    print('{:40} {}  {}'.format(name, 'OK  ' if ok else 'FAIL', details))
+    results.append(ok)
+
+
+def main():
+    threads_count = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    max_in_flight = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+
+    app = create_app({'ADMISSION_MAX_IN_FLIGHT': max_in_flight, 'ADMISSION_QUEUE_TIMEOUT': 0.01})
+    login_rate, login_burst = app.config['RATE_LIMITS']['api.login_route']
+    cart_rate, cart_burst = app.config['RATE_LIMITS']['api.cart_route']
+    rate_limiter.clear()
+
+    with app.app_context():
+        prefix = 'admission-%d' % time.time_ns()
+        users = [User(False, '%s-%d' % (prefix, index), 'bench', 'bench', '', datetime.now()) for index in range(2)]
+        db.session.add_all(users)
+        db.session.commit()
+        user_ids = [user.id for user in users]
+        tokens = [issue_token(user_id) for user_id in user_ids]
+        db.session.commit()
+        # до первой проверки токена лимит считается по адресу, здесь токены проверяются заранее
+        for token in tokens:
+            authenticate(token)
+
+    client = app.test_client()
+    results = []
+
+    responses = burst(client, login_burst * 2, 'POST', '/login', json={"login": prefix, "password": 'wrong'})
+    limited = [response for response in responses if response.status_code == 429]
+    check(results, 'POST /login over the budget', len(limited) == login_burst
+          and all(int(response.headers['Retry-After']) <= 1 / login_rate + 1 for response in limited),
+          '{}, Retry-After {}'.format(dict(statuses(responses)), limited[0].headers.get('Retry-After') if limited else None))
+
+    headers = [{'Authorization': 'Bearer ' + token} for token in tokens]
+    first = burst(client, cart_burst + 10, 'GET', '/cart', headers=headers[0])
+    second = burst(client, 5, 'GET', '/cart', headers=headers[1])
+    check(results, 'GET /cart, first token over the budget', statuses(first)[429] == 10, dict(statuses(first)))
+    check(results, 'GET /cart, second token unaffected', statuses(second)[429] == 0, dict(statuses(second)))
+
+    time.sleep(int(first[-1].headers['Retry-After']))
+    again = client.get('/cart', headers=headers[0])
+    check(results, 'GET /cart after Retry-After', again.status_code == 200, again.status_code)
+
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    count_statement = lambda *args: statements.append(1)
+    event.listen(engine, 'after_cursor_execute', count_statement)
+    junk = [client.post('/cart', json={"product_id": 1, "count": 1},
+                        headers={'Authorization': 'Bearer junk-%d-%d' % (time.time_ns(), index)})
+            for index in range(cart_burst * 10)]
+    event.remove(engine, 'after_cursor_execute', count_statement)
+    check(results, 'POST /cart, new junk token every time', statuses(junk)[429] == cart_burst * 9
+          and len(statements) <= cart_burst * 2,
+          '{}, {} SQL statements'.format(dict(statuses(junk)), len(statements)))
+
+    # дальше проверяется только ограничение одновременных запросов к базе
+    app.config['RATE_LIMIT_ENABLED'] = False
+    shed = Counter()
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads_count)
+
+    def worker():
+        thread_client = app.test_client()
+        barrier.wait()
+        for _ in range(THREAD_REQUESTS):
+            response = thread_client.post('/search', json={"tag": 'a', "limit": 50})
+            with lock:
+                shed[response.status_code] += 1
+                if response.status_code == 503 and 'Retry-After' not in response.headers:
+                    shed['503 without Retry-After'] += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    stats = admission.stats()
+    check(results, 'POST /search, {} threads, {} slots'.format(threads_count, max_in_flight),
+          shed[503] > 0 and not shed['503 without Retry-After'] and stats['peak'] <= max_in_flight,
+          '{} in {:.2f} s, peak in flight {}'.format(dict(shed), elapsed, stats['peak']))
+
+    metrics = request_metrics.render()
+    check(results, 'counters in /metrics', 'rate_limit_limited_api_login_route' in metrics
+          and 'admission_shed' in metrics, '')
+    for line in metrics.splitlines():
+        if line.startswith(('rate_limit_', 'admission_')):
+            print('   ', line)
+
+    with app.app_context():
+        Token.query.filter(Token.user_id.in_(user_ids)).delete(synchronize_session=False)
+        User.query.filter(User.id.in_(user_ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == '__main__':
+    main()
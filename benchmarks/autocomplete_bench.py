@@ -0,0 +1,73 @@
+# Память и скорость индекса подсказок на синтетических товарах (без базы). Память считается
+# только для самого индекса, строки названий создаются до замера:
+# python -m benchmarks.autocomplete_bench [кол-во товаров]
+import gc
+import random
+import sys
+import time
+import tracemalloc
+
+from autocomplete import AutocompleteIndex
+
+WORDS = ['каркассон', 'колонизаторы', 'манчкин', 'имаджинариум', 'диксит', 'взрывные', 'котята',
+         'пандемия', 'азул', 'root', 'gloomhaven', 'wingspan', 'terraforming', 'mars', 'catan',
+         'ticket', 'ride', 'azul', 'splendor', 'codenames', 'dominion', 'everdell', 'cascadia']
+PUBLISHERS = ['Hobby World', 'Мосигра', 'Правильные игры', 'Crowd Games', 'Lavka Games',
+              'GaGa Games', 'Стиль Жизни', 'Эврикус']
+QUERIES = ['к', 'ка', 'кар', 'карк', 'каркассон', 'ma', 'mar', 'hobby', 'пра иг', 'zzz',
+           'cat ka', 'ti ride', 'di lav']
+
+
+# Названия из двух известных слов и одного из нескольких тысяч случайных
+def synthetic(count, rnd):
+    letters = 'абвгдеклмнопрстaeikmnorst'
+    vocabulary = [''.join(rnd.choice(letters) for _ in range(rnd.randint(4, 9))) for _ in range(5000)]
+    rows = [(product_id, '{} {} {}'.format(rnd.choice(WORDS), rnd.choice(WORDS), rnd.choice(vocabulary)),
+             rnd.choice(PUBLISHERS), rnd.randint(0, 50)) for product_id in range(1, count + 1)]
+    sales = {product_id: rnd.randint(0, 500) for product_id in range(1, count + 1, 3)}
+    return rows, sales
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rows, sales = synthetic(count, random.Random(1))
+
+    start = time.perf_counter()
+    AutocompleteIndex().build(rows, sales)
+    elapsed = time.perf_counter() - start
+
+    # память меряется отдельным построением: с tracemalloc оно в несколько раз медленнее
+    gc.collect()
+    tracemalloc.start()
+    index = AutocompleteIndex()
+    index.build(rows, sales)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print('products: {}, terms: {}, build {:.2f} s'.format(count, len(index.terms), elapsed))
+    print('memory: {:.1f} MB (peak during build {:.1f} MB), {:.0f} bytes per product'.format(
+        current / 2 ** 20, peak / 2 ** 20, current / count))
+
+    for query in QUERIES:
+        timings = []
+        for _ in range(200):
+            start = time.perf_counter()
+            found = index.suggest(query, 10)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print('{:12} {:3} found  median {:9.1f} us  p99 {:9.1f} us'.format(
+            repr(query), len(found), timings[len(timings) // 2] * 1e6, timings[int(len(timings) * 0.99)] * 1e6))
+
+    start = time.perf_counter()
+    for product_id in range(1, 1001):
+        index.remove(product_id)
+        index.add(product_id, 'каркассон новый {}'.format(product_id), 'Hobby World', 10)
+    print('1000 updates: {:.1f} ms'.format((time.perf_counter() - start) * 1000))
+    start = time.perf_counter()
+    index.suggest('к', 10)
+    print('first short-prefix query after updates: {:.1f} ms'.format((time.perf_counter() - start) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# Планы выполнения (EXPLAIN) запросов, которые выполняются на каждом запросе к API.
+# Запускается до и после применения миграции с индексами, чтобы сравнить планы:
+# python -m benchmarks.explain_plans [файл для сохранения] [--analyze]
+import sys
+
+from sqlalchemy import text
+
+from app import create_app
+from models import *
+
+app = create_app()
+
+# запрос -> (SQL, пример параметров); параметры берутся из существующих данных
+QUERIES = {
+    'auth (all endpoints)': (
+        'SELECT token.user_id, "user".admin FROM token JOIN "user" ON "user".id = token.user_id '
+        'WHERE token.token = :token', 'token'),
+    'login': ('SELECT * FROM "user" WHERE "user".login = :login', 'login'),
+    'cart GET': (
+        'SELECT tc.id, tc.product_id, tc.count, p.name FROM temp_cart AS tc '
+        'LEFT JOIN product AS p ON p.id = tc.product_id WHERE tc.user_id = :user_id ORDER BY tc.id',
+        'user_id'),
+    'cart POST': (
+        'UPDATE temp_cart SET count = count + 1 WHERE product_id = :product_id AND user_id = :user_id',
+        'cart'),
+    'profile orders': ('SELECT * FROM "order" WHERE "order".user_id = :user_id ORDER BY id', 'user_id'),
+    'order lines': (
+        'SELECT op.order_id, op.product_id, op.product_name, op.product_price FROM order_products AS op '
+        'WHERE op.order_id IN (:order_id) ORDER BY op.order_id, op.id', 'order_id'),
+}
+
+
+def sample_params():
+    token = Token.query.first()
+    user = User.query.first()
+    cart = TempCart.query.first()
+    line = OrderProducts.query.first()
+    return {
+        'token': {'token': token.token if token else ''},
+        'login': {'login': user.login if user else ''},
+        'user_id': {'user_id': user.id if user else 0},
+        'cart': {'product_id': cart.product_id if cart else 0, 'user_id': cart.user_id if cart else 0},
+        'order_id': {'order_id': line.order_id if line else 0},
+    }
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    explain = 'EXPLAIN (ANALYZE, BUFFERS) ' if '--analyze' in sys.argv else 'EXPLAIN '
+
+    lines = []
+    with app.app_context():
+        params = sample_params()
+        for title, (sql, key) in QUERIES.items():
+            lines.append('== ' + title)
+            # ANALYZE выполняет запрос, поэтому изменения откатываются
+            rows = db.session.execute(text(explain + sql), params[key]).fetchall()
+            lines += [row[0] for row in rows]
+            lines.append('')
+            db.session.rollback()
+
+    output = '\n'.join(lines)
+    print(output)
+    if args:
+        with open(args[0], 'w') as file:
+            file.write(output)
+
+
+if __name__ == '__main__':
+    main()
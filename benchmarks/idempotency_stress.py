@@ -0,0 +1,77 @@
+# Проверка ключей идемпотентности при одновременных повторах: несколько потоков
+# одновременно отправляют POST /order с одним и тем же Idempotency-Key.
+# Заказ должен создаться ровно один раз, остальные запросы получают сохраненный
+# ответ или 409 (первый запрос еще выполняется).
+# Запуск на базе из конфигурации приложения (лучше тестовой):
+# python -m benchmarks.idempotency_stress [потоки] [повторы]
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from app import create_app
+from auth import issue_token
+from models import *
+
+# повторы с одним токеном не должны упираться в лимит частоты POST /order
+app = create_app({'RATE_LIMIT_ENABLED': False})
+
+
+def main():
+    threads_count = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    with app.app_context():
+        user = User(False, 'idempotency-%d' % time.time_ns(), 'bench', 'bench', '', datetime.now())
+        product = Product('idempotency bench', 1.0, rounds, 'bench', None)
+        db.session.add_all([user, product])
+        db.session.commit()
+        user_id, product_id = user.id, product.id
+        token = issue_token(user_id)
+        db.session.commit()
+
+    body = {"address": 'bench', "comment": 'bench', "amount": 1,
+            "products": [{"product_id": product_id, "count": 1}]}
+    statuses = Counter()
+    lock = threading.Lock()
+
+    for attempt in range(rounds):
+        barrier = threading.Barrier(threads_count)
+        headers = {'Authorization': 'Bearer ' + token, 'Idempotency-Key': 'bench-%d' % attempt}
+
+        def worker():
+            client = app.test_client()
+            barrier.wait()
+            response = client.post('/order', json=body, headers=headers)
+            status = '%d%s' % (response.status_code, ' replayed' if 'Idempotent-Replayed' in response.headers else '')
+            with lock:
+                statuses[status] += 1
+
+        threads = [threading.Thread(target=worker) for _ in range(threads_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    with app.app_context():
+        orders = Order.query.filter(Order.user_id == user_id).count()
+        print('rounds: {}, threads: {}, orders created: {}'.format(rounds, threads_count, orders))
+        print('responses:', dict(statuses))
+        ok = orders == rounds
+        print('OK' if ok else 'DUPLICATES')
+
+        order_ids = db.session.query(Order.id).filter(Order.user_id == user_id)
+        OrderProducts.query.filter(OrderProducts.order_id.in_(order_ids)).delete(synchronize_session=False)
+        Order.query.filter(Order.user_id == user_id).delete()
+        IdempotencyKey.query.filter(IdempotencyKey.user_id == user_id).delete()
+        Token.query.filter(Token.user_id == user_id).delete()
+        User.query.filter(User.id == user_id).delete()
+        Product.query.filter(Product.id == product_id).delete()
+        db.session.commit()
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
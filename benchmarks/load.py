@@ -0,0 +1,150 @@
+# Нагрузочный прогон API на данных из benchmarks.seed. Запросы выбираются случайно
+# по весам, близким к реальной нагрузке. Для каждого end-point'а выводятся
+# перцентили задержки p50/p95/p99 и пропускная способность.
+# Через тестовый клиент Flask:  python -m benchmarks.load --requests 2000 --threads 4
+# Через запущенный сервер:      python -m benchmarks.load --url http://localhost:5000
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+from app import create_app
+from models import *
+
+# тестовый клиент шлет все запросы с одного адреса и нескольких токенов, поэтому лимиты
+# частоты запросов отключены; ограничение одновременных запросов к базе остается
+app = create_app({'RATE_LIMIT_ENABLED': False})
+
+SEARCH_TAGS = ['cat', 'каркас', 'azul', 'pandem', 'hobby', 'root', 'zzz']
+
+
+# Сценарии: название -> (вес, функция, которая по генератору случайных чисел
+# и данным возвращает метод, путь и тело запроса)
+SCENARIOS = {
+    'GET /products': (30, lambda rnd, data: ('GET', '/products', None)),
+    'GET /product/<id>': (20, lambda rnd, data: ('GET', '/product/%d' % rnd.choice(data['products']), None)),
+    'GET /products/batch': (10, lambda rnd, data: ('GET', '/products/batch?ids=' + ','.join(
+        str(product_id) for product_id in rnd.sample(data['products'], min(30, len(data['products'])))), None)),
+    'POST /search': (15, lambda rnd, data: ('POST', '/search', {"tag": rnd.choice(SEARCH_TAGS)})),
+    'GET /cart': (10, lambda rnd, data: ('GET', '/cart', None)),
+    'POST /cart': (8, lambda rnd, data: ('POST', '/cart', {"product_id": rnd.choice(data['products']),
+                                                           "count": 1})),
+    'POST /order': (3, lambda rnd, data: ('POST', '/order', {
+        "address": 'bench address', "comment": 'bench', "amount": 0,
+        "products": [{"product_id": rnd.choice(data['products']), "count": 1}]})),
+    'GET /profile': (10, lambda rnd, data: ('GET', '/profile', None)),
+    'GET /admin/orders': (4, lambda rnd, data: ('GET', '/admin/orders?limit=50', None)),
+}
+
+
+class TestClient:
+    def __init__(self):
+        self.client = app.test_client()
+
+    def request(self, method, path, body, headers):
+        return self.client.open(path, method=method, json=body, headers=headers).status_code
+
+
+class HttpClient:
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def request(self, method, path, body, headers):
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers = dict(headers, **{'Content-Type': 'application/json'})
+        req = urllib.request.Request(self.url + path, data=data, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(req) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            return error.code
+
+
+def load_data():
+    with app.app_context():
+        products = [row[0] for row in db.session.query(Product.id).filter(Product.name.like('bench-%'))]
+        tokens = [row[0] for row in db.session.query(Token.token).filter(Token.token.like('bench-token-%'))]
+    if not products or not tokens:
+        raise SystemExit('no bench data, run python -m benchmarks.seed first')
+    return {"products": products, "tokens": tokens}
+
+
+def percentile(values, percent):
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def run(make_client, data, requests_count, threads_count, seed):
+    names = list(SCENARIOS)
+    weights = [SCENARIOS[name][0] for name in names]
+    timings = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+
+    def worker(index):
+        rnd = random.Random(seed + index)
+        client = make_client()
+        local_timings = defaultdict(list)
+        local_errors = defaultdict(int)
+        for _ in range(requests_count // threads_count):
+            name = rnd.choices(names, weights)[0]
+            method, path, body = SCENARIOS[name][1](rnd, data)
+            headers = {'Authorization': 'Bearer ' + rnd.choice(data['tokens'])}
+
+            start = time.perf_counter()
+            status = client.request(method, path, body, headers)
+            local_timings[name].append(time.perf_counter() - start)
+            if status >= 500:
+                local_errors[name] += 1
+
+        with lock:
+            for name, values in local_timings.items():
+                timings[name] += values
+            for name, count in local_errors.items():
+                errors[name] += count
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(threads_count)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return timings, errors, time.perf_counter() - start
+
+
+def report(timings, errors, elapsed):
+    print('{:20} {:>7} {:>6} {:>9} {:>9} {:>9} {:>9}'.format(
+        'endpoint', 'count', 'errors', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s'))
+    total = 0
+    for name in SCENARIOS:
+        values = sorted(timings.get(name, []))
+        if not values:
+            continue
+        total += len(values)
+        print('{:20} {:7} {:6} {:9.2f} {:9.2f} {:9.2f} {:9.1f}'.format(
+            name, len(values), errors.get(name, 0), percentile(values, 50) * 1000,
+            percentile(values, 95) * 1000, percentile(values, 99) * 1000, len(values) / elapsed))
+    print('total {} requests in {:.2f} s, {:.1f} req/s'.format(total, elapsed, total / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный прогон API')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--url', help='адрес запущенного сервера, по умолчанию - тестовый клиент Flask')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    data = load_data()
+    make_client = (lambda: HttpClient(args.url)) if args.url else TestClient
+    report(*run(make_client, data, args.requests, args.threads, args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# Сравнение старого создания заказа (коммит заказа, поиск последнего заказа,
+# добавление товаров по одному ORM объекту) и новой вставки в одной транзакции.
+# Запуск на базе из конфигурации приложения (лучше тестовой):
+# python -m benchmarks.order_bench [повторы]
+import sys
+import time
+from datetime import datetime
+
+from app import create_app
+from models import *
+from orders import place_order
+
+app = create_app()
+
+SIZES = [1, 10, 50, 100, 500]
+# заказ списывает товар со склада, остатка должно хватить на все прогоны
+STOCK = 10 ** 9
+
+
+def old_place_order(user_id, address, amount, status, comment, products):
+    db.session.add(Order(user_id, address, amount, status, comment))
+    db.session.commit()
+    order = Order.query.order_by(Order.id.desc()).first()
+    db.session.add_all([OrderProducts(product['product_id'], order.id, product['count'])
+                        for product in products])
+    TempCart.query.filter(TempCart.user_id == user_id).delete()
+    db.session.commit()
+    return order.id
+
+
+def measure(place, user_id, products, repeats):
+    order_ids = []
+    start = time.perf_counter()
+    for _ in range(repeats):
+        order_ids.append(place(user_id, 'bench', 0, 'bench', 'bench', products))
+        db.session.commit()
+        db.session.remove()
+    elapsed = time.perf_counter() - start
+    return elapsed / repeats * 1000, order_ids
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with app.app_context():
+        user = User(False, 'bench-%d' % time.time_ns(), 'bench', 'bench', '', datetime.now())
+        db.session.add(user)
+        db.session.add_all([Product('bench %d' % i, 1.0, STOCK, 'bench', None) for i in range(max(SIZES))])
+        db.session.commit()
+        user_id = user.id
+        product_ids = [p.id for p in Product.query.filter(Product.publisher == 'bench').all()]
+
+        order_ids = []
+        for size in SIZES:
+            products = [{"product_id": product_id, "count": 1} for product_id in product_ids[:size]]
+            old_ms, old_ids = measure(old_place_order, user_id, products, repeats)
+            new_ms, new_ids = measure(place_order, user_id, products, repeats)
+            order_ids += old_ids + new_ids
+            print('{:4} lines  old {:8.3f} ms  new {:8.3f} ms'.format(size, old_ms, new_ms))
+
+        OrderProducts.query.filter(OrderProducts.order_id.in_(order_ids)).delete(synchronize_session=False)
+        Order.query.filter(Order.id.in_(order_ids)).delete(synchronize_session=False)
+        Product.query.filter(Product.id.in_(product_ids)).delete(synchronize_session=False)
+        User.query.filter(User.id == user_id).delete()
+        db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
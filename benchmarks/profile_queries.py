@@ -0,0 +1,69 @@
+# Проверка, что число SQL запросов GET /profile не зависит от количества заказов:
+# запросы считаются у пользователя с N заказами и с 10*N заказами и должны совпасть.
+# Работает на временной базе sqlite в памяти:
+# python -m benchmarks.profile_queries [N]
+import sys
+from datetime import datetime
+
+from flask import g
+
+from app import create_app
+from auth import issue_token
+from models import *
+from orders import place_order
+
+LINES_PER_ORDER = 3
+
+
+def main():
+    orders_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    # у базы в памяти одно соединение на все потоки, фоновое построение индекса подсказок не нужно
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'AUTOCOMPLETE_PRELOAD': False,
+                      'RATE_LIMIT_ENABLED': False})
+
+    # число запросов считает metrics.init_metrics в g.query_count
+    query_counts = []
+
+    @app.after_request
+    def remember_query_count(response):
+        query_counts.append(g.query_count)
+        return response
+
+    with app.app_context():
+        db.create_all()
+        user = User(False, 'bench-profile', 'Bench', 'Profile', '', datetime.now())
+        db.session.add(user)
+        db.session.add_all([Product('bench %d' % i, 1.0, 10 ** 6, 'bench', None) for i in range(LINES_PER_ORDER)])
+        db.session.commit()
+        user_id = user.id
+        headers = {'Authorization': 'Bearer ' + issue_token(user_id)}
+        db.session.commit()
+        products = [{"product_id": row[0], "count": 1} for row in db.session.query(Product.id)]
+
+    client = app.test_client()
+    # первый запрос проверяет токен в базе, дальше токен берется из кэша
+    client.get('/profile', headers=headers)
+
+    results = []
+    for total in (orders_count, orders_count * 10):
+        with app.app_context():
+            existing = Order.query.filter(Order.user_id == user_id).count()
+            for _ in range(total - existing):
+                place_order(user_id, 'bench', 0, 'bench', 'bench', products)
+            db.session.commit()
+
+        response = client.get('/profile', headers=headers)
+        returned = len(response.get_json()['orders'])
+        results.append(query_counts[-1])
+        print('{:5} orders ({} returned): {} SQL queries'.format(total, returned, query_counts[-1]))
+        if returned != total:
+            print('FAIL: expected {} orders in the response'.format(total))
+            sys.exit(1)
+
+    ok = results[0] == results[1]
+    print('OK' if ok else 'FAIL: the number of queries grows with the number of orders')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
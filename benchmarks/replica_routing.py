@@ -0,0 +1,106 @@
+# Проверка направления запросов на чтение в реплики. Основная база и две реплики - отдельные
+# файлы sqlite с разными товарами, поэтому по ответу POST /search видно, откуда он прочитан:
+# - запросы на чтение идут в реплики по кругу;
+# - после записи клиент с cookie читает из основной базы и в другом экземпляре приложения
+#   (как в другом рабочем процессе), пока cookie не устареет; чужая подпись не действует;
+# - клиент без cookie после записи читает из основной базы в том же процессе по токену.
+# python -m benchmarks.replica_routing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine
+
+from app import create_app
+from auth import issue_token
+from models import *
+from routing import ReplicaRouter
+
+PIN_SECONDS = 1
+
+
+def check(results, name, ok, details):
+    print('{:55} {}  {}'.format(name, 'OK  ' if ok else 'FAIL', details))
+    results.append(ok)
+
+
+def searched(client, **kwargs):
+    response = client.post('/search', json={"tag": 'routing'}, **kwargs)
+    return [product['name'] for product in response.get_json()['products']]
+
+
+def main():
+    folder = tempfile.mkdtemp(prefix='replica-routing-')
+    primary = 'sqlite:///' + os.path.join(folder, 'primary.db')
+    replicas = ['sqlite:///' + os.path.join(folder, 'replica_%d.db' % index) for index in range(2)]
+    config = {'SQLALCHEMY_DATABASE_URI': primary, 'SQLALCHEMY_REPLICA_URIS': replicas,
+              'PRIMARY_PIN_SECONDS': PIN_SECONDS, 'SECRET_KEY': 'replica-routing-check',
+              'AUTOCOMPLETE_PRELOAD': False, 'RATE_LIMIT_ENABLED': False}
+    app = create_app(config)
+    # второй экземпляр с тем же ключом - как соседний рабочий процесс, отметок в памяти у него нет
+    other_app = create_app(config)
+
+    with app.app_context():
+        db.create_all()
+        users = [User(False, 'routing-%d' % index, 'bench', 'bench', 'secret', datetime.now()) for index in range(2)]
+        db.session.add_all(users)
+        db.session.add(Product('routing primary', 1.0, 100, 'bench', None))
+        db.session.commit()
+        user_ids = [user.id for user in users]
+        product_id = Product.query.first().id
+        other_token = issue_token(user_ids[1])
+        db.session.commit()
+
+    for index, uri in enumerate(replicas):
+        engine = create_engine(uri)
+        db.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(Product.__table__.insert(), [{'id': product_id, 'name': 'routing replica %d' % index,
+                                                             'price': 1.0, 'stockCount': 100, 'publisher': 'bench'}])
+        engine.dispose()
+
+    results = []
+
+    client = app.test_client()
+    names = [searched(client)[0] for _ in range(4)]
+    check(results, 'reads go to the replicas in turn',
+          names[0] != names[1] and names[:2] == names[2:] and 'routing primary' not in names, names)
+
+    login = client.post('/login', json={"login": 'routing-0', "password": 'secret'})
+    token = login.get_json()['token']
+    pin = login.headers.get('Set-Cookie', '').split(';')[0]
+    check(results, 'a write sets the signed pin cookie', pin.startswith(ReplicaRouter.PIN_COOKIE + '='), pin)
+    names = [searched(client)[0] for _ in range(2)]
+    check(results, 'same client reads the primary', names == ['routing primary'] * 2, names)
+
+    other_client = other_app.test_client(use_cookies=False)
+    name = searched(other_client, headers={'Cookie': pin})[0]
+    check(results, 'pin cookie works in another app instance', name == 'routing primary', name)
+    name = searched(other_client)[0]
+    check(results, 'another instance without the cookie reads a replica', name != 'routing primary', name)
+    forged = pin.split('=')[0] + '=primary.AAAAAA.forged'
+    name = searched(other_client, headers={'Cookie': forged})[0]
+    check(results, 'a forged cookie is ignored', name != 'routing primary', name)
+
+    time.sleep(PIN_SECONDS + 1.5)
+    name = searched(other_client, headers={'Cookie': pin})[0]
+    check(results, 'an expired cookie is ignored', name != 'routing primary', name)
+
+    # клиент без cookie: отметка после записи по токену в памяти процесса
+    headers = {'Authorization': 'Bearer ' + token}
+    added = other_client.post('/cart', json={"product_id": product_id, "count": 1}, headers=headers)
+    check(results, 'write without cookies', added.status_code == 200, added.status_code)
+    name = searched(other_client, headers=headers)[0]
+    check(results, 'same token without cookies reads the primary', name == 'routing primary', name)
+    name = searched(other_client, headers={'Authorization': 'Bearer ' + other_token})[0]
+    check(results, 'another token reads a replica', name != 'routing primary', name)
+
+    shutil.rmtree(folder, ignore_errors=True)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+# Нагрузочная проверка резервирования товара: много потоков одновременно кладут
+# один и тот же товар в корзины разных пользователей. В конце проверяется, что
+# продано не больше, чем было на складе, и остаток сходится с корзинами.
+# Затем - заказ после возврата брошенной корзины на склад: единственную штуку товара
+# резервирует пользователь A, его корзина возвращается на склад, штуку резервирует B,
+# и оба оформляют заказ. Заказ должен получить только B.
+# Запуск на базе из конфигурации приложения (лучше тестовой):
+# python -m benchmarks.reservation_stress [потоки] [запросов на поток] [остаток]
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from app import create_app
+from models import *
+from orders import place_order
+from reservation import release_expired_carts, reserve
+
+app = create_app()
+
+
+def main():
+    threads_count = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    requests_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    stock = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+
+    with app.app_context():
+        product = Product('stress test product', 1.0, stock, 'stress', None)
+        users = [User(False, 'stress-%d-%d' % (time.time_ns(), i), 'stress', 'stress', '', datetime.now())
+                 for i in range(threads_count)]
+        db.session.add(product)
+        db.session.add_all(users)
+        db.session.commit()
+        product_id = product.id
+        user_ids = [user.id for user in users]
+
+    success = [0] * threads_count
+
+    def worker(index):
+        with app.app_context():
+            for _ in range(requests_count):
+                if reserve(user_ids[index], product_id, 1):
+                    success[index] += 1
+                db.session.commit()
+            db.session.remove()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(threads_count)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        left = Product.query.filter(Product.id == product_id).first().stockCount
+        in_carts = db.session.query(func.coalesce(func.sum(TempCart.count), 0))\
+            .filter(TempCart.product_id == product_id).scalar()
+
+        print('requests: {}, reserved: {}, stock left: {}, in carts: {}, {:.0f} req/s'.format(
+            threads_count * requests_count, sum(success), left, in_carts,
+            threads_count * requests_count / elapsed))
+        ok = left >= 0 and sum(success) == in_carts == stock - left
+        print('OK' if ok else 'OVERSOLD')
+
+        TempCart.query.filter(TempCart.product_id == product_id).delete()
+        Product.query.filter(Product.id == product_id).delete()
+        User.query.filter(User.id.in_(user_ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+    ok = order_after_release() and ok
+    sys.exit(0 if ok else 1)
+
+
+def order_after_release():
+    with app.app_context():
+        product = Product('stress release product', 1.0, 1, 'stress', None)
+        users = [User(False, 'stress-release-%d-%d' % (time.time_ns(), i), 'stress', 'stress', '', datetime.now())
+                 for i in range(2)]
+        db.session.add(product)
+        db.session.add_all(users)
+        db.session.commit()
+        product_id = product.id
+        first, second = [user.id for user in users]
+        lines = [{"product_id": product_id, "count": 1}]
+
+        reserve(first, product_id, 1)
+        db.session.commit()
+        # корзина A брошена: не менялась дольше срока резерва
+        TempCart.query.filter(TempCart.user_id == first)\
+            .update({TempCart.updated_at: datetime.now() - timedelta(hours=1)}, synchronize_session=False)
+        db.session.commit()
+        release_expired_carts(60)
+        reserve(second, product_id, 1)
+        db.session.commit()
+
+        placed = []
+        for user_id in (first, second):
+            if place_order(user_id, 'stress', 0, 'stress', 'stress', lines) is None:
+                db.session.rollback()
+            else:
+                db.session.commit()
+                placed.append(user_id)
+
+        left = Product.query.filter(Product.id == product_id).first().stockCount
+        ordered = db.session.query(func.coalesce(func.sum(OrderProducts.count), 0))\
+            .filter(OrderProducts.product_id == product_id).scalar()
+        ok = placed == [second] and ordered == 1 and left == 0
+        print('order after release: ordered {}, stock left {}, placed by {}'.format(
+            ordered, left, 'B' if placed == [second] else placed))
+        print('OK' if ok else 'OVERSOLD')
+
+        order_ids = db.session.query(OrderProducts.order_id).filter(OrderProducts.product_id == product_id)
+        Order.query.filter(Order.id.in_(order_ids)).delete(synchronize_session=False)
+        OrderProducts.query.filter(OrderProducts.product_id == product_id).delete(synchronize_session=False)
+        TempCart.query.filter(TempCart.product_id == product_id).delete()
+        Product.query.filter(Product.id == product_id).delete()
+        User.query.filter(User.id.in_([first, second])).delete(synchronize_session=False)
+        db.session.commit()
+    return ok
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+# Сравнение скорости старого поиска (ILIKE по названию) и нового ранжированного поиска.
+# Запуск на базе из конфигурации приложения: python -m benchmarks.search_bench [повторы]
+import sys
+import time
+
+from app import create_app
+from models import *
+from search import search_products
+
+app = create_app()
+
+TAGS = ['cat', 'game', 'mono', 'hobby', 'карк', 'zzz']
+
+
+def old_search(tag):
+    return Product.query.filter(Product.name.ilike("%{}%".format(tag))).all()
+
+
+def measure(search, repeats):
+    timings = []
+    for _ in range(repeats):
+        for tag in TAGS:
+            start = time.perf_counter()
+            search(tag)
+            timings.append(time.perf_counter() - start)
+            db.session.remove()
+    timings.sort()
+    return sum(timings) / len(timings) * 1000, timings[len(timings) // 2] * 1000
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with app.app_context():
+        print('products:', Product.query.count())
+        for title, search in [('ilike', old_search), ('ranked', search_products)]:
+            mean, median = measure(search, repeats)
+            print('{:8} mean {:8.3f} ms  median {:8.3f} ms'.format(title, mean, median))
+
+
+if __name__ == '__main__':
+    main()
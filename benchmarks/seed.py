@@ -0,0 +1,108 @@
+# Заполнение базы синтетическими данными для нагрузочных тестов.
+# Все записи помечаются префиксом bench-, токены имеют вид bench-token-<id пользователя>.
+# python -m benchmarks.seed [--products N] [--users N] [--orders N] [--lines N] [--cart N]
+# (--orders - заказов на пользователя, --lines - товаров в заказе, --cart - товаров в корзине)
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from app import create_app
+from models import *
+from orders import backfill_order_snapshots
+from sales import rebuild_aggregates
+
+app = create_app()
+
+BATCH_SIZE = 5000
+
+PUBLISHERS = ['Hobby World', 'Cosmodrome', 'Lavka Games', 'Kosmos', 'Asmodee', 'Zvezda',
+              'Days of Wonder', 'Stonemaier', 'Fantasy Flight', 'Rio Grande']
+WORDS = ['Каркассон', 'Catan', 'Ticket', 'Монополия', 'Azul', 'Wingspan', 'Dixit', 'Codenames',
+         'Pandemic', 'Манчкин', 'Splendor', 'Gloomhaven', 'Root', 'Scythe', 'Terraforming']
+
+
+def insert(table, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(table.insert(), rows[start:start + BATCH_SIZE])
+
+
+def ids(model, column, prefix):
+    return [row[0] for row in db.session.query(model.id).filter(column.like(prefix + '%')).order_by(model.id)]
+
+
+def seed(products, users, orders, lines, cart, rnd):
+    insert(Product.__table__, [{
+        "name": 'bench-{} {} {}'.format(rnd.choice(WORDS), rnd.choice(WORDS), i),
+        "price": round(rnd.uniform(300, 9000), 2),
+        "stockCount": rnd.randint(0, 500),
+        "publisher": rnd.choice(PUBLISHERS),
+        "product_image": None} for i in range(products)])
+
+    now = datetime.now()
+    insert(User.__table__, [{
+        "admin": i == 0, "login": 'bench-user-{}'.format(i), "first_name": 'Bench',
+        "name": 'User {}'.format(i), "password": 'bench', "reg_date": now} for i in range(users)])
+    db.session.commit()
+
+    product_ids = ids(Product, Product.name, 'bench-')
+    user_ids = ids(User, User.login, 'bench-user-')
+
+    insert(Token.__table__, [{"user_id": user_id, "token": 'bench-token-{}'.format(user_id)}
+                             for user_id in user_ids])
+    insert(Order.__table__, [{
+        "user_id": user_id, "address": 'bench address', "amount": 0, "status": 'В ожидании',
+        "comment": 'bench', "created_at": now - timedelta(days=rnd.randint(0, 90))}
+        for user_id in user_ids for _ in range(orders)])
+    db.session.commit()
+
+    order_ids = [row[0] for row in db.session.query(Order.id).filter(Order.comment == 'bench')]
+    insert(OrderProducts.__table__, [{
+        "order_id": order_id, "product_id": product_id, "count": rnd.randint(1, 3)}
+        for order_id in order_ids for product_id in rnd.sample(product_ids, min(lines, len(product_ids)))])
+    insert(TempCart.__table__, [{
+        "user_id": user_id, "product_id": product_id, "count": 1}
+        for user_id in user_ids for product_id in rnd.sample(product_ids, min(cart, len(product_ids)))])
+    db.session.commit()
+    # наименование и цена в строках заказов, как у заказов, оформленных через API
+    backfill_order_snapshots(BATCH_SIZE)
+
+
+# Удаление всех данных, созданных seed
+def clean():
+    user_ids = ids(User, User.login, 'bench-user-')
+    product_ids = ids(Product, Product.name, 'bench-')
+    order_ids = db.session.query(Order.id).filter(Order.user_id.in_(user_ids))
+
+    TempCart.query.filter(TempCart.user_id.in_(user_ids)).delete(synchronize_session=False)
+    OrderProducts.query.filter(OrderProducts.order_id.in_(order_ids)).delete(synchronize_session=False)
+    Order.query.filter(Order.user_id.in_(user_ids)).delete(synchronize_session=False)
+    Token.query.filter(Token.user_id.in_(user_ids)).delete(synchronize_session=False)
+    User.query.filter(User.id.in_(user_ids)).delete(synchronize_session=False)
+    Product.query.filter(Product.id.in_(product_ids)).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Заполнение базы синтетическими данными')
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=10)
+    parser.add_argument('--lines', type=int, default=3)
+    parser.add_argument('--cart', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--clean', action='store_true', help='только удалить данные bench-')
+    args = parser.parse_args()
+
+    with app.app_context():
+        start = time.perf_counter()
+        clean()
+        if not args.clean:
+            seed(args.products, args.users, args.orders, args.lines, args.cart, random.Random(args.seed))
+        # статистика продаж после удаления и добавления заказов в обход API
+        rebuild_aggregates()
+        print('done in {:.1f} s'.format(time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main()
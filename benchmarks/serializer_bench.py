@@ -0,0 +1,55 @@
+# Сравнение преобразования списка товаров в JSON через маршмеллоу и через быстрый путь
+# (выборка кортежей + готовый список полей + orjson, если установлен).
+# Работает на временной базе sqlite в памяти: python -m benchmarks.serializer_bench [кол-во товаров]
+import json
+import sys
+import time
+
+from flask import jsonify
+
+from app import create_app
+from marsh_models import *
+from serializers import json_bytes, orjson, product_fast_schema
+
+
+def marshmallow_path():
+    products = Product.query.filter(Product.stockCount > 0).order_by(Product.id).all()
+    return jsonify({"products": ProductJsonSchema(many=True).dump(products)}).get_data()
+
+
+def fast_path():
+    products = product_fast_schema.query().filter(Product.stockCount > 0).order_by(Product.id).all()
+    return json_bytes({"products": product_fast_schema.dump(products)})
+
+
+def measure(build, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        body = build()
+        timings.append(time.perf_counter() - start)
+        db.session.remove()
+    return min(timings) * 1000, body
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Product('Игра %d' % i, 100.0 + i, i % 7, 'Издатель %d' % (i % 50), 'img%d.jpg' % i)
+                            for i in range(count)])
+        db.session.commit()
+
+        old_ms, old_body = measure(marshmallow_path, 5)
+        new_ms, new_body = measure(fast_path, 5)
+
+        print('products: {}, orjson: {}'.format(count, orjson is not None))
+        print('marshmallow {:8.2f} ms'.format(old_ms))
+        print('fast        {:8.2f} ms  (x{:.1f})'.format(new_ms, old_ms / new_ms))
+        print('same output:', json.loads(old_body) == json.loads(new_body))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# Время запуска приложения: импорт модуля app, create_app, первый запрос (соединение с базой,
+# первые запросы SQL, запуск фоновых задач) и второй запрос для сравнения. Каждый прогон -
+# отдельный процесс python, чтобы импорт был холодным. По умолчанию первый запрос - GET /products
+# на временной базе sqlite в памяти, с --env - на базе из переменных окружения (DATABASE_URL):
+# python -m benchmarks.startup_bench --runs 10 [--path /products] [--env] [--migrations]
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+
+# Замеры внутри дочернего процесса, результат печатается одной строкой JSON
+def child(path, use_env, migrations):
+    started = time.perf_counter()
+    import app as module
+    imported = time.perf_counter()
+
+    config = {'MIGRATIONS_ENABLED': migrations}
+    if not use_env:
+        # у базы в памяти одно соединение на все потоки, фоновое построение индекса подсказок не нужно
+        config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        config['AUTOCOMPLETE_PRELOAD'] = False
+    app = module.create_app(config)
+    created = time.perf_counter()
+
+    if not use_env:
+        # подготовка базы не входит в замер; соединение с базой в памяти при этом уже открыто,
+        # время подключения к настоящей базе видно только с --env
+        from models import Product, db
+        with app.app_context():
+            db.create_all()
+            db.session.add_all([Product('bench %d' % i, 1.0, 1, 'bench', None) for i in range(100)])
+            db.session.commit()
+
+    client = app.test_client()
+    before_first = time.perf_counter()
+    status = client.get(path).status_code
+    first = time.perf_counter()
+    client.get(path)
+    second = time.perf_counter()
+
+    print(json.dumps({
+        "import": imported - started,
+        "create_app": created - imported,
+        "first_request": first - before_first,
+        "second_request": second - first,
+        "status": status,
+    }))
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/products')
+    parser.add_argument('--env', action='store_true', help='база из переменных окружения, а не sqlite')
+    parser.add_argument('--migrations', action='store_true', help='подключить Flask-Migrate, как при flask db')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.path, args.env, args.migrations)
+        return
+
+    command = [sys.executable, '-m', 'benchmarks.startup_bench', '--child', '--path', args.path]
+    if args.env:
+        command.append('--env')
+    if args.migrations:
+        command.append('--migrations')
+
+    results = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        result['process'] = time.perf_counter() - start
+        results.append(result)
+
+    print('runs: {}, GET {} -> {}'.format(args.runs, args.path, results[-1]['status']))
+    for name in ['import', 'create_app', 'first_request', 'second_request', 'process']:
+        timings = [result[name] * 1000 for result in results]
+        print('{:15} median {:8.1f} ms  min {:8.1f} ms  max {:8.1f} ms'.format(
+            name, median(timings), min(timings), max(timings)))
+
+
+if __name__ == '__main__':
+    main()
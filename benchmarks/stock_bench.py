@@ -0,0 +1,50 @@
+# Сравнение пополнения склада старым способом (PUT /products, +1 штука за запрос)
+# и одним запросом PUT /products/stock. Работает на временной базе sqlite в памяти:
+# python -m benchmarks.stock_bench [кол-во товаров] [штук каждого товара]
+import sys
+import time
+from datetime import datetime
+
+from app import create_app
+from auth import issue_token
+from models import *
+
+
+def main():
+    products_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    units = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    # у базы в памяти одно соединение на все потоки, фоновое построение индекса подсказок не нужно
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'AUTOCOMPLETE_PRELOAD': False,
+                      'RATE_LIMIT_ENABLED': False})
+
+    with app.app_context():
+        db.create_all()
+        admin = User(True, 'bench-admin', 'Bench', 'Admin', '', datetime.now())
+        db.session.add(admin)
+        db.session.add_all([Product('bench %d' % i, 1.0, 0, 'bench', None) for i in range(products_count)])
+        db.session.commit()
+        headers = {'Authorization': 'Bearer ' + issue_token(admin.id)}
+        db.session.commit()
+        product_ids = [row[0] for row in db.session.query(Product.id)]
+
+    client = app.test_client()
+
+    start = time.perf_counter()
+    for product_id in product_ids:
+        for _ in range(units):
+            client.put('/products', json={"product_id": product_id}, headers=headers)
+    old = time.perf_counter() - start
+
+    start = time.perf_counter()
+    client.put('/products/stock', headers=headers, json={
+        "items": [{"product_id": product_id, "delta": units} for product_id in product_ids]})
+    new = time.perf_counter() - start
+
+    total = products_count * units
+    print('{} units of {} products'.format(units, products_count))
+    print('PUT /products        {:5} requests {:9.1f} ms  {:9.0f} units/s'.format(total, old * 1000, total / old))
+    print('PUT /products/stock  {:5} requests {:9.1f} ms  {:9.0f} units/s'.format(1, new * 1000, total / new))
+
+
+if __name__ == '__main__':
+    main()
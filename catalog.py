@@ -0,0 +1,140 @@
+import base64
+import json
+
+from sqlalchemy import and_, case, func, or_
+
+from models import *
+
+CATALOG_DEFAULT_LIMIT = 50
+CATALOG_MAX_LIMIT = 200
+# Границы ценовых диапазонов для подсчета товаров по цене
+PRICE_BUCKETS = (500, 1000, 2000, 5000)
+# Диапазон для товаров без цены: фильтры min_price/max_price такие товары не выбирают,
+# поэтому ни в один диапазон цен они не попадают
+PRICE_BUCKET_EMPTY = 'none'
+
+# Поля сортировки: для каждого - выражение без NULL, чтобы курсор был однозначным
+SORT_FIELDS = {
+    'id': Product.id,
+    'price': func.coalesce(Product.price, 0),
+    'name': func.coalesce(Product.name, ''),
+}
+# значения, которыми заменяется NULL при сортировке
+SORT_FIELDS_EMPTY = {'price': 0, 'name': ''}
+
+
+class CatalogError(ValueError):
+    pass
+
+
+# Разбор параметров просмотра каталога из строки запроса:
+# publisher (можно несколько), min_price, max_price, in_stock (по умолчанию true),
+# sort (id, price, name, с минусом - по убыванию), limit, cursor, facets
+def parse_filters(args):
+    try:
+        filters = {
+            "publishers": args.getlist('publisher'),
+            "min_price": args.get('min_price', type=float),
+            "max_price": args.get('max_price', type=float),
+            "in_stock": args.get('in_stock', 'true').lower() not in ('false', '0', 'no'),
+            "sort": args.get('sort', 'id'),
+            "limit": args.get('limit', CATALOG_DEFAULT_LIMIT, type=int),
+            "cursor": decode_cursor(args['cursor']) if args.get('cursor') else None,
+            "facets": args.get('facets', 'false').lower() in ('true', '1', 'yes'),
+        }
+    except (TypeError, ValueError):
+        raise CatalogError('invalid cursor')
+
+    if filters['sort'].lstrip('-') not in SORT_FIELDS:
+        raise CatalogError('unknown sort field')
+    filters['limit'] = max(1, min(filters['limit'], CATALOG_MAX_LIMIT))
+    return filters
+
+
+# Курсор - значение поля сортировки и id последнего товара на странице
+def encode_cursor(value, product_id):
+    return base64.urlsafe_b64encode(json.dumps([value, product_id]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    value, product_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return value, int(product_id)
+
+
+def filter_conditions(filters):
+    conditions = []
+    if filters['in_stock']:
+        conditions.append(Product.stockCount > 0)
+    if filters['publishers']:
+        conditions.append(Product.publisher.in_(filters['publishers']))
+    if filters['min_price'] is not None:
+        conditions.append(Product.price >= filters['min_price'])
+    if filters['max_price'] is not None:
+        conditions.append(Product.price <= filters['max_price'])
+    return conditions
+
+
+# Страница каталога с сортировкой и постраничной выдачей по ключу (значение поля, id).
+# query - запрос с нужными колонками, в нем должны быть колонки id, price и name.
+# Возвращает строки и курсор следующей страницы (None, если страниц больше нет)
+def browse_products(query, filters):
+    descending = filters['sort'].startswith('-')
+    field = filters['sort'].lstrip('-')
+    key = SORT_FIELDS[field]
+
+    conditions = filter_conditions(filters)
+    if filters['cursor'] is not None:
+        value, last_id = filters['cursor']
+        if field == 'id':
+            conditions.append(Product.id < last_id if descending else Product.id > last_id)
+        else:
+            beyond = key < value if descending else key > value
+            conditions.append(or_(beyond, and_(key == value, Product.id > last_id)))
+
+    order = [key.desc() if descending else key]
+    if field != 'id':
+        order.append(Product.id)
+
+    rows = query.filter(*conditions).order_by(*order).limit(filters['limit'] + 1).all()
+
+    next_cursor = None
+    if len(rows) > filters['limit']:
+        rows = rows[:filters['limit']]
+        last = rows[-1]
+        value = last.id if field == 'id' else (getattr(last, field) or SORT_FIELDS_EMPTY[field])
+        next_cursor = encode_cursor(value, last.id)
+    return rows, next_cursor
+
+
+def price_bucket_names():
+    bounds = (0,) + PRICE_BUCKETS
+    names = ['{}-{}'.format(low, high) for low, high in zip(bounds, PRICE_BUCKETS)]
+    return names + ['{}+'.format(PRICE_BUCKETS[-1])]
+
+
+# Количество товаров по издателям и по ценовым диапазонам для текущих фильтров.
+# Оба подсчета делаются одним запросом с группировкой по паре (издатель, диапазон)
+def catalog_facets(filters):
+    names = price_bucket_names()
+    bucket = case(
+        (Product.price.is_(None), PRICE_BUCKET_EMPTY),
+        *[(Product.price < bound, name) for bound, name in zip(PRICE_BUCKETS, names)],
+        else_=names[-1])
+    names.append(PRICE_BUCKET_EMPTY)
+
+    rows = db.session.query(Product.publisher, bucket.label('bucket'), func.count(Product.id))\
+        .filter(*filter_conditions(filters))\
+        .group_by(Product.publisher, bucket)\
+        .all()
+
+    publishers = {}
+    prices = {name: 0 for name in names}
+    for publisher, bucket_name, count in rows:
+        publishers[publisher] = publishers.get(publisher, 0) + count
+        prices[bucket_name] += count
+
+    return {
+        "publishers": [{"publisher": name, "count": count}
+                       for name, count in sorted(publishers.items(), key=lambda item: (-item[1], item[0] or ''))],
+        "price": [{"range": name, "count": prices[name]} for name in names],
+    }
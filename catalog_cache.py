@@ -0,0 +1,106 @@
+import hashlib
+import threading
+import time
+
+from flask import current_app, request
+
+from routing import use_primary
+from serializers import json_bytes
+
+
+# Кэш уже преобразованных в JSON ответов каталога. Любое изменение товаров
+# увеличивает номер версии и сбрасывает кэш. Так как кэш живет в памяти процесса,
+# записи дополнительно устаревают через ttl секунд - так изменения, сделанные
+# в другом процессе сервера, тоже попадут к клиентам.
+# Данные для кэша всегда читаются из основной базы, а не из реплики: иначе сразу после
+# изменения в кэш под новой версией мог бы попасть ответ отстающей реплики, и его получил бы
+# даже сам автор изменения, которому обещано чтение из основной базы
+class CatalogCache:
+    def __init__(self, ttl=30, max_size=1000, max_records=10000):
+        self.ttl = ttl
+        # ключей может быть много (фильтры каталога), поэтому их количество ограничено
+        self.max_size = max_size
+        # отдельно ограничено количество записей о товарах (см. get_many)
+        self.max_records = max_records
+        self.version = 0
+        self._items = {}
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def bump(self):
+        with self._lock:
+            self.version += 1
+            self._items.clear()
+            self._records.clear()
+
+    # Возвращает (тело ответа, etag) по ключу. Если в кэше нет актуальной записи,
+    # вызывает build, который возвращает данные для JSON или None (не кэшируется)
+    def get(self, key, build):
+        with self._lock:
+            version = self.version
+            item = self._items.get(key)
+        if item is not None and item[0] == version and item[1] > time.monotonic():
+            return item[2], item[3]
+
+        with use_primary():
+            data = build()
+        if data is None:
+            return None
+        body = json_bytes(data)
+        etag = hashlib.sha1(body).hexdigest()
+
+        with self._lock:
+            # пока строили ответ, каталог мог измениться - тогда не сохраняем
+            if self.version == version and (key in self._items or len(self._items) < self.max_size):
+                self._items[key] = (version, time.monotonic() + self.ttl, body, etag)
+        return body, etag
+
+    # Данные (не готовые ответы) сразу по нескольким ключам, например отдельные товары:
+    # их используют и ответ по одному товару, и ответ по списку товаров.
+    # build получает список ключей, которых нет в кэше, и возвращает словарь ключ -> данные;
+    # ключи, которых нет в этом словаре (товар не найден), не кэшируются
+    def get_many(self, keys, build):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            version = self.version
+            for key in keys:
+                record = self._records.get(key)
+                if record is not None and record[0] == version and record[1] > now:
+                    found[key] = record[2]
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            with use_primary():
+                built = build(missing)
+            with self._lock:
+                if self.version == version:
+                    expires = time.monotonic() + self.ttl
+                    for key, data in built.items():
+                        if key in self._records or len(self._records) < self.max_records:
+                            self._records[key] = (version, expires, data)
+            found.update(built)
+        return found
+
+
+catalog_cache = CatalogCache()
+
+
+# Ответ из кэша каталога с заголовком ETag. Если у клиента уже есть актуальная
+# версия (заголовок If-None-Match), вернется пустой ответ 304
+def cached_json_response(key, build):
+    cached = catalog_cache.get(key, build)
+    if cached is None:
+        return None
+
+    body, etag = cached
+    return conditional_json_response(body, etag)
+
+
+# Ответ с готовым телом JSON и заголовком ETag (по умолчанию - хэш тела)
+def conditional_json_response(body, etag=None):
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag or hashlib.sha1(body).hexdigest())
+    # клиент и прокси могут хранить ответ, но должны сверять его по ETag
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
@@ -0,0 +1,134 @@
+import hashlib
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, g, jsonify, request
+from sqlalchemy.exc import IntegrityError
+
+from models import *
+
+
+# Отпечаток запроса: метод, путь и тело. Повтор с тем же ключом, но другим телом - ошибка клиента
+def request_fingerprint():
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.path.encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+# Занять ключ: вставить строку с пустым ответом. Уникальный индекс (user_id, key) гарантирует,
+# что из одновременных запросов с одним ключом работу выполнит только один.
+# Ключ без ответа старше IDEMPOTENCY_LOCK_SECONDS считается брошенным и занимается заново:
+# работа брошенного запроса не закоммичена (она коммитится вместе с ответом), а если он
+# все-таки дойдет до конца, то увидит, что ключ занят другим, и откатит свою работу.
+# Возвращает (строка ключа, True) если ключ наш, иначе (существующая строка, False)
+def claim_key(user_id, key, fingerprint):
+    now = datetime.now()
+    expired_before = now - timedelta(seconds=current_app.config['IDEMPOTENCY_TTL'])
+    stale_before = now - timedelta(seconds=current_app.config['IDEMPOTENCY_LOCK_SECONDS'])
+
+    # устаревший ключ или брошенный (сервер упал или запрос слишком долгий) можно использовать заново
+    IdempotencyKey.query.filter(
+        IdempotencyKey.user_id == user_id, IdempotencyKey.key == key,
+        (IdempotencyKey.created_at < expired_before)
+        | (IdempotencyKey.status_code.is_(None) & (IdempotencyKey.created_at < stale_before)))\
+        .delete(synchronize_session=False)
+
+    row = IdempotencyKey(user_id, key, fingerprint, now)
+    db.session.add(row)
+    try:
+        db.session.commit()
+        return row, True
+    except IntegrityError:
+        db.session.rollback()
+
+    return IdempotencyKey.query.filter(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key).first(), False
+
+
+# Декоратор для end-point'ов с заголовком Idempotency-Key (используется после auth_required).
+# Первый запрос с ключом выполняется, его ответ сохраняется; повторы с тем же ключом получают
+# сохраненный ответ с заголовком Idempotent-Replayed, а пока первый еще выполняется - 409.
+# В methods перечисляются методы, для которых это работает. Для этих методов end-point сам
+# не коммитит: коммит делает декоратор, и ответ сохраняется в той же транзакции, что и работа,
+# поэтому упавший между коммитом и сохранением ответа сервер не приведет к повтору работы
+def idempotent(*methods):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if methods and request.method not in methods:
+                return view(*args, **kwargs)
+            key = request.headers.get('Idempotency-Key')
+            if key is None:
+                response = view(*args, **kwargs)
+                db.session.commit()
+                return response
+            if not key or len(key) > 255:
+                return jsonify({"message": "Invalid Idempotency-Key", "code": "400"}), 400
+
+            fingerprint = request_fingerprint()
+            row, claimed = claim_key(g.user_id, key, fingerprint)
+
+            if not claimed:
+                if row is None:
+                    # ключ удалили между вставкой и чтением - пусть клиент повторит
+                    return retry_later()
+                if row.fingerprint != fingerprint:
+                    return jsonify({"message": "Idempotency-Key was used with another request",
+                                    "code": "422"}), 422
+                if row.status_code is None:
+                    return retry_later()
+                response = current_app.response_class(row.body, status=row.status_code, mimetype=row.mimetype)
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+
+            row_id = row.id
+            try:
+                response = current_app.make_response(view(*args, **kwargs))
+                saved = IdempotencyKey.query\
+                    .filter(IdempotencyKey.id == row_id, IdempotencyKey.status_code.is_(None))\
+                    .update({IdempotencyKey.status_code: response.status_code,
+                             IdempotencyKey.mimetype: response.mimetype,
+                             IdempotencyKey.body: response.get_data()}, synchronize_session=False)
+            except Exception:
+                # запрос не выполнен - освобождаем ключ, чтобы повтор выполнил работу
+                db.session.rollback()
+                IdempotencyKey.query.filter(IdempotencyKey.id == row_id).delete()
+                db.session.commit()
+                raise
+
+            if not saved:
+                # запрос шел так долго, что ключ посчитали брошенным и его занял повтор -
+                # работа этого запроса не сохраняется, клиент получит ответ повтора
+                db.session.rollback()
+                return retry_later()
+            db.session.commit()
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def retry_later():
+    response = jsonify({"message": "A request with this Idempotency-Key is in progress", "code": "409"})
+    response.status_code = 409
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+# Удаление устаревших ключей пачками, как и для токенов
+def sweep_idempotency_keys(ttl, batch_size=1000, max_batches=100):
+    deleted = 0
+    for _ in range(max_batches):
+        expired = db.session.query(IdempotencyKey.id)\
+            .filter(IdempotencyKey.created_at < datetime.now() - timedelta(seconds=ttl))\
+            .limit(batch_size)\
+            .subquery()
+        count = IdempotencyKey.query.filter(IdempotencyKey.id.in_(db.session.query(expired.c.id)))\
+            .delete(synchronize_session=False)
+        db.session.commit()
+        deleted += count
+        if count < batch_size:
+            break
+    return deleted
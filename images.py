@@ -0,0 +1,97 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.utils import secure_filename
+
+try:
+    # Pillow нужен только для уменьшенных копий картинок, без него отдаются оригиналы
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Уменьшенные копии картинок: название -> максимальный размер стороны в пикселях
+IMAGE_VARIANTS = {
+    'thumbnail': 160,
+    'card': 480,
+    'full': 1280,
+}
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
+
+# Уменьшенные копии создаются в фоне, чтобы не задерживать ответ на загрузку
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='image-variants')
+
+
+# Сохранение загруженной картинки под именем из хэша ее содержимого. Файл читается
+# кусками и сразу пишется на диск с подсчетом хэша; если такая картинка уже есть,
+# то второй раз она не сохраняется. Возвращает имя файла для поля product_image
+def save_upload(file, folder):
+    extension = os.path.splitext(secure_filename(file.filename or ''))[1].lower()
+    if extension not in IMAGE_EXTENSIONS:
+        extension = '.jpg'
+
+    digest = hashlib.sha256()
+    descriptor, temp_path = tempfile.mkstemp(dir=folder, suffix='.upload')
+    with os.fdopen(descriptor, 'wb') as temp:
+        for chunk in iter(lambda: file.stream.read(64 * 1024), b''):
+            digest.update(chunk)
+            temp.write(chunk)
+
+    filename = digest.hexdigest()[:32] + extension
+    path = os.path.join(folder, filename)
+    if os.path.exists(path):
+        os.remove(temp_path)
+    else:
+        os.replace(temp_path, path)
+
+    _executor.submit(make_variants, folder, filename)
+    return filename
+
+
+def variant_filename(filename, variant):
+    return '{}-{}.jpg'.format(os.path.splitext(filename)[0], variant)
+
+
+# Создание уменьшенных копий картинки, уже существующие копии не пересоздаются
+def make_variants(folder, filename):
+    if Image is None:
+        return
+    try:
+        with Image.open(os.path.join(folder, filename)) as original:
+            original = original.convert('RGB')
+            for variant, size in IMAGE_VARIANTS.items():
+                path = os.path.join(folder, variant_filename(filename, variant))
+                if os.path.exists(path):
+                    continue
+                image = original.copy()
+                image.thumbnail((size, size))
+                # сначала во временный файл, чтобы никто не прочитал недописанную картинку
+                temp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+                image.save(temp_path, 'JPEG', quality=85, optimize=True, progressive=True)
+                os.replace(temp_path, path)
+    except Exception:
+        logger.exception('can not make variants of image %s', filename)
+
+
+# Путь к файлу для отдачи и признак, что это окончательный файл для такого адреса.
+# Если уменьшенная копия еще не готова, отдается оригинал, но его нельзя кэшировать
+# навсегда. None, если картинки нет
+def variant_path(folder, filename, variant):
+    filename = secure_filename(filename)
+    if not filename or not os.path.exists(os.path.join(folder, filename)):
+        return None
+
+    if variant in IMAGE_VARIANTS:
+        path = os.path.join(folder, variant_filename(filename, variant))
+        if os.path.exists(path):
+            return path, True
+        # копия еще не готова (или картинка загружена раньше) - создаем ее в фоне
+        if Image is not None:
+            _executor.submit(make_variants, folder, filename)
+            return os.path.join(folder, filename), False
+    return os.path.join(folder, filename), True
@@ -0,0 +1,146 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from datetime import datetime
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм: время в секундах и количество SQL запросов
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+
+# Гистограмма в стиле Prometheus: количество значений, их сумма и
+# сколько значений попало в каждую корзину (не больше ее границы)
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+    def lines(self, name, labels):
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            result.append('%s_bucket{%s,le="%s"} %d' % (name, labels, bound, count))
+        result.append('%s_bucket{%s,le="+Inf"} %d' % (name, labels, self.count))
+        result.append('%s_sum{%s} %s' % (name, labels, self.sum))
+        result.append('%s_count{%s} %d' % (name, labels, self.count))
+        return result
+
+
+# Метрики по каждому end-point'у: время ответа, число SQL запросов и время в базе
+class RequestMetrics:
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+        # дополнительные счетчики других модулей: имя -> функция, возвращающая словарь значений
+        self.collectors = {}
+
+    def observe(self, method, route, elapsed, queries, db_time):
+        with self._lock:
+            histograms = self._routes.get((method, route))
+            if histograms is None:
+                histograms = self._routes[(method, route)] = (
+                    Histogram(LATENCY_BUCKETS), Histogram(QUERY_BUCKETS), Histogram(LATENCY_BUCKETS))
+            histograms[0].observe(elapsed)
+            histograms[1].observe(queries)
+            histograms[2].observe(db_time)
+
+    # текстовый формат, который понимает Prometheus
+    def render(self):
+        lines = []
+        with self._lock:
+            for (method, route), (latency, queries, db_time) in sorted(self._routes.items()):
+                labels = 'method="%s",route="%s"' % (method, route)
+                lines += latency.lines('http_request_duration_seconds', labels)
+                lines += queries.lines('http_request_sql_queries', labels)
+                lines += db_time.lines('http_request_db_duration_seconds', labels)
+        for name, collect in sorted(self.collectors.items()):
+            for key, value in sorted(collect().items()):
+                lines.append('%s_%s %s' % (name, key, value))
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
+
+
+# Счетчики SQL запросов текущего HTTP запроса. События вешаются на класс Engine,
+# поэтому считаются запросы ко всем базам, с которыми работает приложение
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'query_started' in g:
+        g.query_count = g.get('query_count', 0) + 1
+        g.db_time = g.get('db_time', 0) + time.perf_counter() - g.pop('query_started')
+
+
+# Подключение сбора метрик к приложению. Если включен PROFILE_SLOW_REQUESTS, то доля
+# запросов PROFILE_SAMPLE_RATE выполняется под cProfile, и для запросов дольше
+# PROFILE_SLOW_REQUEST_MS в папку PROFILE_DIR сохраняется .prof файл (его можно открыть
+# в snakeviz или превратить во flamegraph через flameprof), а в лог пишутся самые долгие функции
+def init_metrics(app):
+    @app.before_request
+    def start_request_metrics():
+        g.request_started = time.perf_counter()
+        g.query_count = 0
+        g.db_time = 0
+        if app.config.get('PROFILE_SLOW_REQUESTS') \
+                and random.random() < app.config.get('PROFILE_SAMPLE_RATE', 1.0):
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def finish_request_metrics(response):
+        if 'request_started' not in g:
+            return response
+        elapsed = time.perf_counter() - g.request_started
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            if elapsed * 1000 >= app.config.get('PROFILE_SLOW_REQUEST_MS', 500):
+                save_profile(app, profiler, elapsed)
+
+        rule = request.url_rule.rule if request.url_rule is not None else 'not_found'
+        request_metrics.observe(request.method, rule, elapsed, g.query_count, g.db_time)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_route():
+        return app.response_class(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def save_profile(app, profiler, elapsed):
+    folder = app.config.get('PROFILE_DIR', 'profiles')
+    os.makedirs(folder, exist_ok=True)
+    name = '%s-%s-%s.prof' % (datetime.now().strftime('%Y%m%d_%H%M%S_%f'), request.method,
+                              request.path.strip('/').replace('/', '_') or 'root')
+    profiler.dump_stats(os.path.join(folder, name))
+
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(20)
+    logger.warning('slow request %s %s: %.0f ms, %d queries, %.0f ms in db, profile %s\n%s',
+                   request.method, request.path, elapsed * 1000, g.query_count, g.db_time * 1000,
+                   name, summary.getvalue())
@@ -0,0 +1,30 @@
+"""token issue and expiry timestamps
+
+Revision ID: 1cb9ac9e1a8a
+Revises: 216655f9c629
+Create Date: 2026-10-18 12:31:05.902411
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1cb9ac9e1a8a'
+down_revision = '216655f9c629'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('token', sa.Column('created_at', sa.DateTime(), nullable=True))
+    op.add_column('token', sa.Column('expires_at', sa.DateTime(), nullable=True))
+    # уже выданные токены считаем выданными сейчас и действующими 30 дней
+    op.execute("UPDATE token SET created_at = now(), expires_at = now() + interval '30 days'")
+    op.create_index(op.f('ix_token_expires_at'), 'token', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_token_expires_at'), table_name='token')
+    op.drop_column('token', 'expires_at')
+    op.drop_column('token', 'created_at')
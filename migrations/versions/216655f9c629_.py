@@ -0,0 +1,40 @@
+"""indexes for token, cart, order and login lookups
+
+Revision ID: 216655f9c629
+Revises: b899a47a4db7
+Create Date: 2026-10-18 12:02:47.113052
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '216655f9c629'
+down_revision = 'b899a47a4db7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # перед уникальным индексом склеиваем повторяющиеся строки корзины одного пользователя
+    op.execute('UPDATE temp_cart AS t SET count = s.total '
+               'FROM (SELECT min(id) AS id, sum(count) AS total FROM temp_cart '
+               'GROUP BY user_id, product_id HAVING count(*) > 1) AS s '
+               'WHERE t.id = s.id')
+    op.execute('DELETE FROM temp_cart AS t USING temp_cart AS k '
+               'WHERE t.user_id = k.user_id AND t.product_id = k.product_id AND t.id > k.id')
+
+    op.create_index(op.f('ix_token_token'), 'token', ['token'], unique=True)
+    op.create_index(op.f('ix_user_login'), 'user', ['login'], unique=True)
+    op.create_index(op.f('ix_order_user_id'), 'order', ['user_id'], unique=False)
+    op.create_index(op.f('ix_order_products_order_id'), 'order_products', ['order_id'], unique=False)
+    op.create_unique_constraint('uq_temp_cart_user_id_product_id', 'temp_cart', ['user_id', 'product_id'])
+
+
+def downgrade():
+    op.drop_constraint('uq_temp_cart_user_id_product_id', 'temp_cart', type_='unique')
+    op.drop_index(op.f('ix_order_products_order_id'), table_name='order_products')
+    op.drop_index(op.f('ix_order_user_id'), table_name='order')
+    op.drop_index(op.f('ix_user_login'), table_name='user')
+    op.drop_index(op.f('ix_token_token'), table_name='token')
@@ -0,0 +1,30 @@
+"""order line snapshots
+
+Revision ID: 7e2d4a9c0b13
+Revises: 9111941ec854
+Create Date: 2026-10-18 15:02:11.418093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e2d4a9c0b13'
+down_revision = '9111941ec854'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # колонки без значения по умолчанию добавляются без переписывания таблицы;
+    # старые строки заполняются пачками: flask backfill-order-snapshots
+    op.add_column('order_products', sa.Column('product_name', sa.String(), nullable=True))
+    op.add_column('order_products', sa.Column('product_price', sa.Float(), nullable=True))
+    op.add_column('order_products', sa.Column('product_image', sa.String(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('order_products', 'product_image')
+    op.drop_column('order_products', 'product_price')
+    op.drop_column('order_products', 'product_name')
@@ -0,0 +1,35 @@
+"""catalog browsing indexes on product
+
+Revision ID: 9f4b2c8e71d0
+Revises: 1cb9ac9e1a8a
+Create Date: 2026-10-18 13:05:44.270916
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f4b2c8e71d0'
+down_revision = '1cb9ac9e1a8a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # фильтр по издателю и подсчет товаров по издателям
+    op.create_index('ix_product_publisher_price', 'product', ['publisher', 'price'], unique=False)
+    # сортировка по цене и по наименованию с курсором (значение, id), только товары в наличии
+    op.create_index('ix_product_in_stock_price', 'product', [sa.text('coalesce(price, 0)'), 'id'],
+                    unique=False, postgresql_where=sa.text('"stockCount" > 0'))
+    op.create_index('ix_product_in_stock_name', 'product', [sa.text("coalesce(name, '')"), 'id'],
+                    unique=False, postgresql_where=sa.text('"stockCount" > 0'))
+    op.create_index('ix_product_in_stock_id', 'product', ['id'],
+                    unique=False, postgresql_where=sa.text('"stockCount" > 0'))
+
+
+def downgrade():
+    op.drop_index('ix_product_in_stock_id', table_name='product')
+    op.drop_index('ix_product_in_stock_name', table_name='product')
+    op.drop_index('ix_product_in_stock_price', table_name='product')
+    op.drop_index('ix_product_publisher_price', table_name='product')
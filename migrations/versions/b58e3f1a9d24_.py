@@ -0,0 +1,26 @@
+"""order line publisher snapshot
+
+Revision ID: b58e3f1a9d24
+Revises: d41a6c8e2f57
+Create Date: 2026-10-18 19:12:44.270358
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b58e3f1a9d24'
+down_revision = 'd41a6c8e2f57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # старые строки заполняются пачками: flask backfill-order-snapshots,
+    # после этого статистика по издателям пересчитывается: flask rebuild-sales-aggregates
+    op.add_column('order_products', sa.Column('product_publisher', sa.String(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('order_products', 'product_publisher')
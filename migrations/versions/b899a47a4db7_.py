@@ -0,0 +1,29 @@
+"""trigram search indexes on product
+
+Revision ID: b899a47a4db7
+Revises: 4b9a1f78e97c
+Create Date: 2026-10-18 11:40:12.418305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b899a47a4db7'
+down_revision = '4b9a1f78e97c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_product_name_trgm', 'product', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_product_publisher_trgm', 'product', ['publisher'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'publisher': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_product_publisher_trgm', table_name='product')
+    op.drop_index('ix_product_name_trgm', table_name='product')
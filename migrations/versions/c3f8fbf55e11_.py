@@ -0,0 +1,28 @@
+"""temp_cart last touched timestamp
+
+Revision ID: c3f8fbf55e11
+Revises: 9f4b2c8e71d0
+Create Date: 2026-10-18 13:31:20.514603
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f8fbf55e11'
+down_revision = '9f4b2c8e71d0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('temp_cart', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    # уже существующие корзины считаем измененными сейчас
+    op.execute('UPDATE temp_cart SET updated_at = now()')
+    op.create_index(op.f('ix_temp_cart_updated_at'), 'temp_cart', ['updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_temp_cart_updated_at'), table_name='temp_cart')
+    op.drop_column('temp_cart', 'updated_at')
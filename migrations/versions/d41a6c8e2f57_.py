@@ -0,0 +1,38 @@
+"""sales aggregates
+
+Revision ID: d41a6c8e2f57
+Revises: 7e2d4a9c0b13
+Create Date: 2026-10-18 15:47:30.902514
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41a6c8e2f57'
+down_revision = '7e2d4a9c0b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('order', sa.Column('created_at', sa.DateTime(), nullable=True))
+    op.create_table('sales_aggregate',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('kind', 'key', name='uq_sales_aggregate_kind_key')
+    )
+    op.create_index('ix_sales_aggregate_kind_units', 'sales_aggregate', ['kind', 'units'], unique=False)
+    # статистика по уже существующим заказам: flask rebuild-sales-aggregates
+
+
+def downgrade():
+    op.drop_index('ix_sales_aggregate_kind_units', table_name='sales_aggregate')
+    op.drop_table('sales_aggregate')
+    op.drop_column('order', 'created_at')
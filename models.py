@@ -1,12 +1,26 @@
-from flask_sqlalchemy import SQLAlchemy
+from routing import RoutingSQLAlchemy
 
-# Объект орм с ссылкой на базу
-db = SQLAlchemy()
+# Объект орм с ссылкой на базу (запросы на чтение могут идти в реплики, см. routing.py)
+db = RoutingSQLAlchemy()
 
 
 # Модель Продуктов, отражает все свойства таблицы
 class Product(db.Model):
     __tablename__ = 'product'
+    # триграммные индексы для поиска по подстроке и нечеткого поиска (расширение pg_trgm)
+    __table_args__ = (
+        db.Index('ix_product_name_trgm', 'name',
+                 postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_product_publisher_trgm', 'publisher',
+                 postgresql_using='gin', postgresql_ops={'publisher': 'gin_trgm_ops'}),
+        # индексы для фильтров, сортировки и курсоров каталога
+        db.Index('ix_product_publisher_price', 'publisher', 'price'),
+        db.Index('ix_product_in_stock_price', db.func.coalesce(db.column('price'), 0), 'id',
+                 postgresql_where=db.text('"stockCount" > 0')),
+        db.Index('ix_product_in_stock_name', db.func.coalesce(db.column('name'), ''), 'id',
+                 postgresql_where=db.text('"stockCount" > 0')),
+        db.Index('ix_product_in_stock_id', 'id', postgresql_where=db.text('"stockCount" > 0')),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String())
@@ -29,7 +43,7 @@ class User(db.Model):
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     admin = db.Column(db.Boolean)
-    login = db.Column(db.String())
+    login = db.Column(db.String(), unique=True, index=True)
     first_name = db.Column(db.String())
     name = db.Column(db.String())
     password = db.Column(db.String())
@@ -50,20 +64,22 @@ class Order(db.Model):
     __tablename__ = 'order'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     address = db.Column(db.String)
     amount = db.Column(db.Float)
     status = db.Column(db.String)
     comment = db.Column(db.String)
+    created_at = db.Column(db.DateTime)
 
     users = db.relationship('User', backref='user')
 
-    def __init__(self, user_id, address, amount, status, comment):
+    def __init__(self, user_id, address, amount, status, comment, created_at=None):
         self.user_id = user_id
         self.address = address
         self.amount = amount
         self.status = status
         self.comment = comment
+        self.created_at = created_at
 
 
 class OrderProducts(db.Model):
@@ -71,41 +87,116 @@ class OrderProducts(db.Model):
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'))
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'))
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), index=True)
     count = db.Column(db.Integer)
+    # наименование, цена за штуку, картинка и издатель товара на момент заказа: история заказов
+    # показывает то, что было куплено, и читается без соединения с таблицей товаров,
+    # а статистика продаж по издателям не меняется, если у товара потом сменился издатель
+    product_name = db.Column(db.String())
+    product_price = db.Column(db.Float)
+    product_image = db.Column(db.String())
+    product_publisher = db.Column(db.String())
 
     products = db.relationship('Product', backref='product')
     orders = db.relationship('Order', backref='order')
 
-    def __init__(self, product_id, order_id, count):
+    def __init__(self, product_id, order_id, count, product_name=None, product_price=None, product_image=None,
+                 product_publisher=None):
         self.product_id = product_id
         self.order_id = order_id
         self.count = count
+        self.product_name = product_name
+        self.product_price = product_price
+        self.product_image = product_image
+        self.product_publisher = product_publisher
 
 
 # Вторая временная корзина для хранения выбранных товаров.
 class TempCart(db.Model):
     __tablename__ = 'temp_cart'
+    # у пользователя одна строка корзины на каждый товар
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'product_id', name='uq_temp_cart_user_id_product_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     product_id = db.Column(db.Integer)  # ,# db.ForeignKey('product.id'))
     user_id = db.Column(db.Integer)  # , #db.ForeignKey('user.id'))
     count = db.Column(db.Integer)
+    # время последнего изменения корзины, по нему резерв возвращается на склад
+    updated_at = db.Column(db.DateTime, index=True)
 
-    def __init__(self, product_id, user_id, count):
+    def __init__(self, product_id, user_id, count, updated_at=None):
         self.product_id = product_id
         self.user_id = user_id
         self.count = count
+        self.updated_at = updated_at
 
 
 # Временная таблица для хранения токен-строк, по которым можно получить информацию по аккаунту.
+# Токен действует до expires_at, просроченные токены удаляются фоновой задачей
 class Token(db.Model):
     __tablename__ = 'token'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    token = db.Column(db.String())
+    token = db.Column(db.String(), unique=True, index=True)
+    created_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime, index=True)
+
+    def __init__(self, user_id, token, created_at=None, expires_at=None):
+        self.user_id = user_id
+        self.token = token
+        self.created_at = created_at
+        self.expires_at = expires_at
 
-    def __init__(self, user_id, token):
+
+# Ключи идемпотентности: повторный запрос с тем же заголовком Idempotency-Key
+# получает сохраненный ответ вместо повторного выполнения. Пока запрос выполняется,
+# status_code пустой
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_key'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uq_idempotency_key_user_id_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer)
+    key = db.Column(db.String(255))
+    fingerprint = db.Column(db.String(64))
+    status_code = db.Column(db.Integer)
+    mimetype = db.Column(db.String(255))
+    body = db.Column(db.LargeBinary)
+    created_at = db.Column(db.DateTime, index=True)
+
+    def __init__(self, user_id, key, fingerprint, created_at):
         self.user_id = user_id
-        self.token = token
\ No newline at end of file
+        self.key = key
+        self.fingerprint = fingerprint
+        self.created_at = created_at
+
+
+# Заранее посчитанная статистика продаж (см. sales.py). kind - вид статистики:
+# day (ключ - дата заказа), product (id товара), publisher (издатель), status (статус заказа).
+# Обновляется в той же транзакции, что и заказы, поэтому для отчета не нужно читать все заказы
+class SalesAggregate(db.Model):
+    __tablename__ = 'sales_aggregate'
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'key', name='uq_sales_aggregate_kind_key'),
+        # самые продаваемые товары и издатели
+        db.Index('ix_sales_aggregate_kind_units', 'kind', 'units'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    kind = db.Column(db.String(16), nullable=False)
+    key = db.Column(db.String(), nullable=False)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+    def __init__(self, kind, key, orders=0, units=0, revenue=0):
+        self.kind = kind
+        self.key = key
+        self.orders = orders
+        self.units = units
+        self.revenue = revenue
@@ -0,0 +1,85 @@
+from sqlalchemy import func
+
+from models import *
+from orders import load_snapshots
+from serializers import order_fast_schema
+
+
+# Загрузка состава сразу нескольких заказов одним запросом вместо отдельного
+# запроса на каждый заказ. Наименование, цена и картинка берутся из самих строк заказа
+# (как было на момент покупки), поэтому читается только таблица order_products.
+# Возвращает словарь: идентификатор заказа -> список товаров.
+# with_user=True добавляет к каждому товару имя покупателя (нужно для админки)
+def load_order_products(order_ids, with_user=False):
+    result = {order_id: [] for order_id in order_ids}
+    if not result:
+        return result
+
+    rows = db.session.query(
+        OrderProducts.order_id,
+        OrderProducts.product_id.label('id'),
+        OrderProducts.product_name,
+        OrderProducts.product_image,
+        OrderProducts.count.label('product_count'),
+        OrderProducts.product_price)\
+        .filter(OrderProducts.order_id.in_(list(result)))\
+        .order_by(OrderProducts.order_id, OrderProducts.id)\
+        .all()
+
+    lines = [dict(row._mapping) for row in rows]
+    fill_missing_snapshots(lines)
+
+    users = load_order_users(list(result)) if with_user else {}
+    for line in lines:
+        order_id = line.pop('order_id')
+        if with_user:
+            line['user'] = users.get(order_id)
+        result[order_id].append(line)
+
+    return result
+
+
+# Строки заказов, созданные до появления снимков товара и еще не заполненные
+# (flask backfill-order-snapshots), дополняются текущими данными товаров одним запросом
+def fill_missing_snapshots(lines):
+    missing = [line for line in lines
+               if line['product_name'] is None and line['product_price'] is None and line['product_image'] is None]
+    if not missing:
+        return
+
+    snapshots = load_snapshots({line['id'] for line in missing})
+    for line in missing:
+        snapshot = snapshots.get(line['id'], {})
+        for key in ('product_name', 'product_price', 'product_image'):
+            line[key] = snapshot.get(key)
+
+
+# Имя покупателя каждого заказа: идентификатор заказа -> "имя фамилия".
+# Строки склеиваются оператором || (есть и в PostgreSQL, и в SQLite, в отличие от concat),
+# пустое имя или фамилия заменяются пустой строкой, как это делает concat
+def load_order_users(order_ids):
+    full_name = func.coalesce(User.first_name, '') + ' ' + func.coalesce(User.name, '')
+    rows = db.session.query(Order.id, full_name)\
+        .join(User, User.id == Order.user_id)\
+        .filter(Order.id.in_(order_ids))\
+        .all()
+    return dict(rows)
+
+
+# Добавляет к уже преобразованным в JSON заказам их товары
+def attach_order_products(orders, with_user=False):
+    products = load_order_products([order['id'] for order in orders], with_user)
+    for order in orders:
+        order.update({"products": products[order['id']]})
+    return orders
+
+
+# Страница заказов для админки по ключу: заказы с id больше after, не больше limit штук
+# (limit=None - все оставшиеся заказы), вместе с товарами и покупателем
+def load_orders_page(after=0, limit=None):
+    query = order_fast_schema.query().filter(Order.id > after).order_by(Order.id)
+    if limit is not None:
+        query = query.limit(limit)
+
+    orders = order_fast_schema.dump(query.all())
+    return attach_order_products(orders, with_user=True)
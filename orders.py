@@ -0,0 +1,86 @@
+from datetime import datetime
+
+from models import *
+from reservation import take_for_order
+from sales import record_order
+
+# у всех строк пакетной вставки должен быть одинаковый набор колонок
+EMPTY_SNAPSHOT = {"product_name": None, "product_price": None, "product_image": None, "product_publisher": None}
+
+
+# Создание заказа в одной транзакции: товары списываются со склада (из резерва в корзине,
+# а чего там нет - с остатка, см. take_for_order), идентификатор заказа возвращается самой
+# вставкой (INSERT ... RETURNING в PostgreSQL), товары заказа добавляются одной пакетной
+# вставкой и статистика продаж обновляется в той же транзакции.
+# Наименование, цена, картинка и издатель товаров запоминаются в строках заказа одним запросом.
+# Коммит остается за вызывающим кодом (для POST /order его делает idempotent вместе
+# с сохранением ответа). Возвращает идентификатор заказа или None, если товара не хватает -
+# тогда транзакцию нужно откатить
+def place_order(user_id, address, amount, status, comment, products):
+    quantities = {}
+    for product in products or []:
+        quantities[product['product_id']] = quantities.get(product['product_id'], 0) + max(product['count'], 0)
+    if not take_for_order(user_id, quantities):
+        return None
+
+    order = Order(user_id, address, amount, status, comment, datetime.now())
+    db.session.add(order)
+    # flush отправляет INSERT без коммита, после него у заказа уже есть id
+    db.session.flush()
+
+    lines = []
+    if products:
+        snapshots = load_snapshots({product['product_id'] for product in products})
+        lines = [dict(snapshots.get(product['product_id'], EMPTY_SNAPSHOT),
+                      product_id=product['product_id'], order_id=order.id, count=product['count'])
+                 for product in products]
+        db.session.execute(OrderProducts.__table__.insert(), lines)
+
+    # статистика продаж обновляется последней, чтобы ее строки были заблокированы как можно меньше
+    record_order(order.created_at, status, lines)
+    db.session.flush()
+
+    return order.id
+
+
+# Наименование, цена, картинка и издатель товаров для строк заказа: идентификатор товара -> словарь
+def load_snapshots(product_ids):
+    rows = db.session.query(Product.id, Product.name, Product.price, Product.product_image, Product.publisher)\
+        .filter(Product.id.in_(list(product_ids)))\
+        .all()
+    return {row.id: {"product_name": row.name, "product_price": row.price, "product_image": row.product_image,
+                     "product_publisher": row.publisher}
+            for row in rows}
+
+
+# Заполнение наименования, цены, картинки и издателя в строках заказов, созданных до появления
+# этих колонок (значения берутся текущие - других уже нет). У строк, где наименование, цена
+# и картинка уже запомнены, заполняется только издатель. Строки обходятся по id пачками,
+# каждая пачка - своя транзакция, чтобы не держать блокировки на всей таблице.
+# Запуск: flask backfill-order-snapshots. Возвращает количество обновленных строк
+def backfill_order_snapshots(batch_size=1000, max_batches=None):
+    updated = 0
+    last_id = 0
+    batches = 0
+    no_snapshot = OrderProducts.product_name.is_(None) & OrderProducts.product_price.is_(None) \
+        & OrderProducts.product_image.is_(None)
+    while max_batches is None or batches < max_batches:
+        rows = db.session.query(OrderProducts.id, OrderProducts.product_id, no_snapshot.label('no_snapshot'))\
+            .filter(OrderProducts.id > last_id, no_snapshot | OrderProducts.product_publisher.is_(None))\
+            .order_by(OrderProducts.id)\
+            .limit(batch_size)\
+            .all()
+        if not rows:
+            break
+
+        snapshots = load_snapshots({row.product_id for row in rows})
+        mappings = [dict(snapshots[row.product_id], id=row.id) if row.no_snapshot
+                    else {"id": row.id, "product_publisher": snapshots[row.product_id]['product_publisher']}
+                    for row in rows if row.product_id in snapshots]
+        db.session.bulk_update_mappings(OrderProducts, mappings)
+        db.session.commit()
+
+        updated += len(mappings)
+        last_id = rows[-1].id
+        batches += 1
+    return updated
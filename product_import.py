@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+import math
+
+from models import *
+
+IMPORT_BATCH_SIZE = 1000
+# больше ошибок в отчет не попадает, но счетчик ошибок продолжает расти
+IMPORT_MAX_ERRORS = 1000
+
+
+# Чтение строк загружаемого файла по одной, без загрузки всего файла в память.
+# Возвращает пары (номер строки, словарь полей) или (номер строки, текст ошибки)
+def read_rows(stream, file_format):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+    if file_format == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, 'invalid json'
+            continue
+        if not isinstance(row, dict):
+            yield line_number, 'object expected'
+            continue
+        yield line_number, row
+
+
+# Проверка и приведение полей товара. Возвращает словарь для вставки или текст ошибки
+def validate_row(row):
+    name = row.get('name')
+    if not isinstance(name, str) or not name.strip():
+        return 'name is required'
+    try:
+        price = float(row.get('price'))
+        stock_count = int(row.get('stockCount'))
+    except (TypeError, ValueError, OverflowError):
+        return 'price and stockCount must be numbers'
+    # nan и inf проходят float() и сравнение с нулем, но в каталоге им не место
+    if not math.isfinite(price):
+        return 'price must be a finite number'
+    if price < 0 or stock_count < 0:
+        return 'price and stockCount must not be negative'
+
+    publisher = row.get('publisher')
+    return {"name": name.strip(), "price": price, "stockCount": stock_count,
+            "publisher": publisher if publisher else None}
+
+
+# Запись пачки товаров: товары с уже существующими наименованиями обновляются,
+# остальные добавляются. И то, и другое - одним пакетным запросом
+def write_batch(batch):
+    # если наименование повторяется в пачке, то побеждает последняя строка
+    batch = list({row['name']: row for row in batch}.values())
+
+    existing = {}
+    for product_id, name in db.session.query(Product.id, Product.name)\
+            .filter(Product.name.in_([row['name'] for row in batch]))\
+            .order_by(Product.id.desc()):
+        existing[name] = product_id
+
+    updates = [dict(row, id=existing[row['name']]) for row in batch if row['name'] in existing]
+    inserts = [dict(row, product_image=None) for row in batch if row['name'] not in existing]
+
+    if updates:
+        db.session.bulk_update_mappings(Product, updates)
+    if inserts:
+        db.session.execute(Product.__table__.insert(), inserts)
+    db.session.commit()
+
+    return len(inserts), len(updates)
+
+
+# Импорт товаров из CSV (заголовок name,price,stockCount,publisher) или NDJSON
+# (по JSON объекту на строку). Запись идет пачками по IMPORT_BATCH_SIZE строк,
+# каждая пачка в своей транзакции. Возвращает отчет со списком ошибочных строк
+def import_products(stream, file_format):
+    report = {"inserted": 0, "updated": 0, "failed": 0, "errors": []}
+    batch = []
+
+    def flush():
+        inserted, updated = write_batch(batch)
+        report['inserted'] += inserted
+        report['updated'] += updated
+        batch.clear()
+
+    try:
+        for line_number, row in read_rows(stream, file_format):
+            if isinstance(row, dict):
+                row = validate_row(row)
+            if isinstance(row, str):
+                report['failed'] += 1
+                if len(report['errors']) < IMPORT_MAX_ERRORS:
+                    report['errors'].append({"line": line_number, "error": row})
+                continue
+
+            batch.append(row)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                flush()
+    except (UnicodeDecodeError, csv.Error) as error:
+        # дальше файл прочитать нельзя, уже записанные пачки остаются
+        report['errors'].append({"line": None, "error": 'invalid file: {}'.format(error)})
+
+    if batch:
+        flush()
+
+    return report
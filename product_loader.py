@@ -0,0 +1,25 @@
+from catalog_cache import catalog_cache
+from models import *
+from serializers import product_fast_schema
+
+# Сколько товаров можно запросить за раз в GET /products/batch
+PRODUCT_BATCH_MAX_IDS = 100
+
+
+# Загрузка нескольких товаров одним запросом IN. Возвращает словарь: идентификатор -> товар
+# в том же виде, что и ProductJsonSchema().dump
+def load_products(product_ids):
+    rows = product_fast_schema.query()\
+        .filter(Product.id.in_(product_ids))\
+        .all()
+    return {product['id']: product for product in product_fast_schema.dump(rows)}
+
+
+# Товары из кэша каталога (общего для GET /product/<id> и GET /products/batch),
+# отсутствующие в кэше загружаются одним запросом. Ненайденных товаров нет в словаре
+def cached_products(product_ids):
+    keys = [('product', product_id) for product_id in product_ids]
+    found = catalog_cache.get_many(keys, lambda missing: {
+        ('product', product_id): product
+        for product_id, product in load_products([key[1] for key in missing]).items()})
+    return {key[1]: product for key, product in found.items()}
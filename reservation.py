@@ -0,0 +1,160 @@
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import case
+
+from models import *
+
+
+# Резервирование товара в корзине пользователя. Остаток на складе и количество
+# в корзине меняются одиночными условными UPDATE, а не чтением и записью в Python,
+# поэтому при одновременных запросах нельзя продать больше, чем есть на складе.
+# count > 0 - положить товар в корзину, count < 0 - вернуть товар из корзины на склад.
+# Возвращает False, если на складе (или в корзине) не хватает товара - тогда вызывающий
+# код должен откатить транзакцию, иначе коммит тоже остается за ним.
+# Строка товара всегда блокируется раньше строки корзины (как и в release_expired_carts),
+# чтобы одновременные транзакции не ждали друг друга по кругу
+def reserve(user_id, product_id, count):
+    if count == 0:
+        return False
+
+    in_cart = (TempCart.product_id == product_id) & (TempCart.user_id == user_id)
+    now = datetime.now()
+
+    if count > 0:
+        # списываем со склада, только если хватает остатка. UPDATE блокирует строку товара
+        # до конца транзакции, поэтому запросы по одному товару дальше идут по очереди
+        taken = Product.query\
+            .filter(Product.id == product_id, Product.stockCount >= count)\
+            .update({Product.stockCount: Product.stockCount - count}, synchronize_session=False)
+        if taken == 0:
+            return False
+
+        updated = TempCart.query.filter(in_cart)\
+            .update({TempCart.count: TempCart.count + count, TempCart.updated_at: now},
+                    synchronize_session=False)
+        if updated == 0:
+            db.session.add(TempCart(product_id, user_id, count, now))
+        return True
+
+    # возвращаем на склад и уменьшаем корзину, только если в ней достаточно товара
+    Product.query.filter(Product.id == product_id)\
+        .update({Product.stockCount: Product.stockCount - count}, synchronize_session=False)
+    returned = TempCart.query.filter(in_cart, TempCart.count >= -count)\
+        .update({TempCart.count: TempCart.count + count, TempCart.updated_at: now},
+                synchronize_session=False)
+    if returned == 0:
+        return False
+
+    TempCart.query.filter(in_cart, TempCart.count <= 0).delete(synchronize_session=False)
+    return True
+
+
+# Списание товаров заказа: quantities - идентификатор товара -> сколько штук заказано.
+# Зарезервированное в корзине уже снято со склада и просто забирается из корзины. Если резерв
+# вернули на склад (корзина была брошена, см. release_expired_carts) или в корзине товара меньше,
+# чем в заказе, недостающее списывается условным UPDATE, как в reserve (один UPDATE на все
+# товары заказа: если остатка хватает не у всех товаров, заказ не оформляется). Лишнее
+# в корзине возвращается на склад, корзина очищается. Строки товаров блокируются раньше строк
+# корзины, как и в reserve. Возвращает False, если товара не хватает (или его нет) - тогда
+# вызывающий код должен откатить транзакцию, иначе коммит тоже остается за ним
+def take_for_order(user_id, quantities):
+    in_cart = db.session.query(TempCart.product_id).filter(TempCart.user_id == user_id).all()
+    product_ids = set(quantities) | {row.product_id for row in in_cart}
+    db.session.query(Product.id)\
+        .filter(Product.id.in_(product_ids))\
+        .order_by(Product.id)\
+        .with_for_update()\
+        .all()
+
+    reserved = {}
+    rows = db.session.query(TempCart.product_id, TempCart.count)\
+        .filter(TempCart.user_id == user_id)\
+        .with_for_update()\
+        .all()
+    for row in rows:
+        reserved[row.product_id] = reserved.get(row.product_id, 0) + row.count
+
+    shortfall = {product_id: count - reserved.get(product_id, 0)
+                 for product_id, count in quantities.items() if count > reserved.get(product_id, 0)}
+    if shortfall:
+        needed = case(shortfall, value=Product.id)
+        taken = Product.query\
+            .filter(Product.id.in_(list(shortfall)), Product.stockCount >= needed)\
+            .update({Product.stockCount: Product.stockCount - needed}, synchronize_session=False)
+        if taken < len(shortfall):
+            return False
+
+    surplus = {product_id: count - quantities.get(product_id, 0)
+               for product_id, count in reserved.items() if count > quantities.get(product_id, 0)}
+    if surplus:
+        Product.query.filter(Product.id.in_(list(surplus)))\
+            .update({Product.stockCount: Product.stockCount + case(surplus, value=Product.id, else_=0)},
+                    synchronize_session=False)
+    TempCart.query.filter(TempCart.user_id == user_id).delete(synchronize_session=False)
+    return True
+
+
+# Статистика возврата брошенных корзин на склад (выводится в /metrics)
+release_stats = {"runs": 0, "released_rows": 0, "released_units": 0,
+                 "last_run_rows": 0, "last_run_units": 0}
+_release_stats_lock = threading.Lock()
+
+
+# Возврат на склад товаров из корзин, которые не менялись больше ttl секунд.
+# Работает пачками по batch_size строк корзины, каждая пачка - своя транзакция:
+# блокируются строки товаров, затем строки корзины (тот же порядок, что и в reserve),
+# остатки всех товаров пачки увеличиваются одним UPDATE, затем строки корзины удаляются.
+# Возвращает (удалено строк корзины, возвращено единиц товара)
+def release_expired_carts(ttl, batch_size=500, max_batches=100):
+    expired_before = datetime.now() - timedelta(seconds=ttl)
+    rows_total = 0
+    units_total = 0
+
+    for _ in range(max_batches):
+        candidates = db.session.query(TempCart.id, TempCart.product_id)\
+            .filter(TempCart.updated_at < expired_before)\
+            .order_by(TempCart.id)\
+            .limit(batch_size)\
+            .all()
+        if not candidates:
+            db.session.rollback()
+            break
+
+        db.session.query(Product.id)\
+            .filter(Product.id.in_({row.product_id for row in candidates}))\
+            .order_by(Product.id)\
+            .with_for_update()\
+            .all()
+        # пока ждали блокировку, корзину могли изменить - берем только все еще брошенные строки
+        rows = db.session.query(TempCart.id, TempCart.product_id, TempCart.count)\
+            .filter(TempCart.id.in_([row.id for row in candidates]),
+                    TempCart.updated_at < expired_before)\
+            .with_for_update()\
+            .all()
+
+        returned = {}
+        for row in rows:
+            returned[row.product_id] = returned.get(row.product_id, 0) + row.count
+
+        if returned:
+            Product.query.filter(Product.id.in_(list(returned)))\
+                .update({Product.stockCount: Product.stockCount + case(returned, value=Product.id, else_=0)},
+                        synchronize_session=False)
+            TempCart.query.filter(TempCart.id.in_([row.id for row in rows]))\
+                .delete(synchronize_session=False)
+        db.session.commit()
+
+        rows_total += len(rows)
+        units_total += sum(returned.values())
+        if len(candidates) < batch_size:
+            break
+
+    with _release_stats_lock:
+        release_stats['runs'] += 1
+        release_stats['released_rows'] += rows_total
+        release_stats['released_units'] += units_total
+        release_stats['last_run_rows'] = rows_total
+        release_stats['last_run_units'] = units_total
+
+    return rows_total, units_total
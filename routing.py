@@ -0,0 +1,146 @@
+import itertools
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from itsdangerous import BadSignature, TimestampSigner
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import orm
+
+
+# Сессия, которая в запросах только на чтение отправляет запросы в реплику базы.
+# Реплика выбирается в начале HTTP запроса (g.replica), запись (flush) всегда идет в основную базу
+class RoutingSession(SignallingSession):
+    def get_bind(self, mapper=None, clause=None):
+        if has_request_context() and g.get('replica') and not g.get('force_primary') and not self._flushing:
+            return get_state(self.app).db.get_engine(self.app, bind=g.replica)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+# Запросы внутри блока with use_primary() идут в основную базу, даже если запрос только на чтение
+@contextmanager
+def use_primary():
+    forced = g.get('force_primary', False)
+    g.force_primary = True
+    try:
+        yield
+    finally:
+        g.force_primary = forced
+
+
+# Направление запросов на чтение в реплики. Адреса реплик берутся из SQLALCHEMY_REPLICA_URIS
+# и регистрируются как binds replica_0, replica_1, ...; реплики выбираются по кругу.
+# Запросами на чтение считаются GET/HEAD (кроме write_endpoints) и read_endpoints.
+# После успешного запроса на запись клиент еще PRIMARY_PIN_SECONDS читает из основной базы,
+# чтобы видеть свои изменения несмотря на отставание реплик. Отметка об этом хранится у клиента:
+# cookie с временем записи, подписанное SECRET_KEY, поэтому ее видит любой рабочий процесс.
+# Для клиентов без cookie отметка по токену или адресу дополнительно запоминается в памяти процесса
+class ReplicaRouter:
+    PIN_COOKIE = 'primary_pin'
+
+    def __init__(self, read_endpoints=(), write_endpoints=()):
+        self.read_endpoints = set(read_endpoints)
+        self.write_endpoints = set(write_endpoints)
+        self.replicas = []
+        self._cycle = None
+        self._pinned = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        uris = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        self.replicas = []
+        for index, uri in enumerate(uris):
+            binds['replica_%d' % index] = uri
+            self.replicas.append('replica_%d' % index)
+        app.config['SQLALCHEMY_BINDS'] = binds
+        self._cycle = itertools.cycle(self.replicas)
+
+        app.before_request(lambda: self.choose_replica(app))
+        app.after_request(lambda response: self.pin_writer(app, response))
+
+    def is_read_only(self):
+        if request.endpoint in self.write_endpoints:
+            return False
+        return request.method in ('GET', 'HEAD') or request.endpoint in self.read_endpoints
+
+    def client_key(self):
+        return request.headers.get('Authorization') or request.remote_addr
+
+    def signer(self, app):
+        return TimestampSigner(app.secret_key, salt='primary-pin')
+
+    # Подпись cookie проверяется вместе со временем записи: старая отметка уже не действует
+    def pinned_by_cookie(self, app):
+        value = request.cookies.get(self.PIN_COOKIE)
+        if not value:
+            return False
+        try:
+            self.signer(app).unsign(value, max_age=app.config.get('PRIMARY_PIN_SECONDS', 5))
+        except BadSignature:
+            return False
+        return True
+
+    def choose_replica(self, app):
+        g.replica = None
+        if not self.replicas or not self.is_read_only():
+            return
+        if self.pinned_by_cookie(app):
+            return
+
+        key = self.client_key()
+        with self._lock:
+            pinned_until = self._pinned.get(key)
+            if pinned_until is not None and pinned_until > time.monotonic():
+                return
+            self._pinned.pop(key, None)
+            g.replica = next(self._cycle)
+
+    def pin_writer(self, app, response):
+        if self.replicas and not self.is_read_only() and response.status_code < 400:
+            seconds = app.config.get('PRIMARY_PIN_SECONDS', 5)
+            response.set_cookie(self.PIN_COOKIE, self.signer(app).sign('primary').decode(),
+                                max_age=seconds, httponly=True, samesite='Lax')
+            with self._lock:
+                now = time.monotonic()
+                # заодно чистим устаревшие отметки, чтобы словарь не рос бесконечно
+                if len(self._pinned) > 10000:
+                    self._pinned = {key: until for key, until in self._pinned.items() if until > now}
+                self._pinned[self.client_key()] = now + seconds
+        return response
+
+
+# Сброс пулов соединений всех движков приложения (основная база и реплики).
+# close=False - соединения не закрываются, а просто забываются: так делается в дочернем
+# процессе после fork, чтобы не разорвать соединения, которые остались у родителя
+def dispose_engines(app, close=True):
+    for connector in list(get_state(app).connectors.values()):
+        if connector._engine is not None:
+            connector._engine.dispose(close=close)
+
+
+_fork_safe_apps = weakref.WeakSet()
+_fork_hook_registered = False
+
+
+def _dispose_after_fork():
+    for app in list(_fork_safe_apps):
+        dispose_engines(app, close=False)
+
+
+# Если приложение создано до fork (gunicorn --preload) и уже открывало соединения,
+# каждый рабочий процесс начинает с пустым пулом, а не делит сокеты с родителем и соседями
+def fork_safe_engines(app):
+    global _fork_hook_registered
+    if not _fork_hook_registered and hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_dispose_after_fork)
+        _fork_hook_registered = True
+    _fork_safe_apps.add(app)
@@ -0,0 +1,207 @@
+from sqlalchemy import func, text
+from sqlalchemy.exc import IntegrityError
+
+from models import *
+
+# Сколько самых продаваемых товаров и издателей отдается по умолчанию
+SALES_DEFAULT_TOP = 20
+SALES_MAX_TOP = 1000
+# Отличие выручки, которое при сверке считается ошибкой округления
+SALES_REVENUE_TOLERANCE = 0.01
+# Ключ дня для заказов, созданных до появления order.created_at
+UNKNOWN_DAY = 'unknown'
+
+
+def day_key(created_at):
+    return created_at.date().isoformat() if created_at is not None else UNKNOWN_DAY
+
+
+# Прибавление к статистике. changes - словарь (kind, key) -> (заказов, штук, выручка).
+# Строки обновляются в порядке (kind, key), чтобы одновременные заказы блокировали их
+# в одном порядке. В PostgreSQL и SQLite это один пакетный INSERT ... ON CONFLICT DO UPDATE
+def add_to_aggregates(changes):
+    if not changes:
+        return
+
+    rows = [{"kind": kind, "key": key, "orders": orders, "units": units, "revenue": revenue}
+            for (kind, key), (orders, units, revenue) in sorted(changes.items())]
+
+    dialect = db.engine.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        table = SalesAggregate.__table__
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(index_elements=['kind', 'key'], set_={
+            "orders": table.c.orders + statement.excluded.orders,
+            "units": table.c.units + statement.excluded.units,
+            "revenue": table.c.revenue + statement.excluded.revenue})
+        db.session.execute(statement, rows)
+        return
+
+    for row in rows:
+        increment_row(row)
+
+
+# Для остальных баз: UPDATE, а если строки еще нет - INSERT в точке сохранения;
+# если ее одновременно вставил другой запрос - снова UPDATE
+def increment_row(row):
+    def update():
+        return SalesAggregate.query\
+            .filter(SalesAggregate.kind == row['kind'], SalesAggregate.key == row['key'])\
+            .update({SalesAggregate.orders: SalesAggregate.orders + row['orders'],
+                     SalesAggregate.units: SalesAggregate.units + row['units'],
+                     SalesAggregate.revenue: SalesAggregate.revenue + row['revenue']},
+                    synchronize_session=False)
+
+    if update():
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(SalesAggregate.__table__.insert(), row)
+    except IntegrityError:
+        update()
+
+
+# Изменения статистики от одного заказа. lines - строки заказа (product_id, count, product_price,
+# product_publisher). Выручка и издатель берутся из строк заказа, как было на момент покупки
+def order_changes(created_at, status, lines):
+    changes = {}
+
+    def add(kind, key, orders, units, revenue):
+        old = changes.get((kind, key), (0, 0, 0))
+        changes[(kind, key)] = (old[0] + orders, old[1] + units, old[2] + revenue)
+
+    units_total = 0
+    revenue_total = 0
+    for line in lines:
+        count = line['count'] or 0
+        revenue = count * (line['product_price'] or 0)
+        units_total += count
+        revenue_total += revenue
+        add('product', str(line['product_id']), 0, count, revenue)
+        add('publisher', line['product_publisher'] or '', 0, count, revenue)
+
+    add('day', day_key(created_at), 1, units_total, revenue_total)
+    add('status', status or '', 1, 0, 0)
+    return changes
+
+
+# Учет нового заказа (вызывается из place_order до коммита)
+def record_order(created_at, status, lines):
+    add_to_aggregates(order_changes(created_at, status, lines))
+
+
+# Учет смены статуса заказа (вызывается до коммита)
+def record_status_change(old_status, new_status):
+    if old_status == new_status:
+        return
+    add_to_aggregates({("status", old_status or ''): (-1, 0, 0), ("status", new_status or ''): (1, 0, 0)})
+
+
+# Полный пересчет статистики по всем заказам: (kind, key) -> (заказов, штук, выручка).
+# Четыре запроса с группировкой, на больших таблицах это дорого - только для пересборки и сверки
+def compute_aggregates():
+    result = {}
+    revenue = func.coalesce(func.sum(OrderProducts.count * func.coalesce(OrderProducts.product_price, 0)), 0)
+    units = func.coalesce(func.sum(OrderProducts.count), 0)
+
+    # заказы по дням считаются отдельно от строк, чтобы заказы без товаров тоже попали в статистику
+    order_day = func.date(Order.created_at)
+    for day, orders in db.session.query(order_day, func.count(Order.id)).group_by(order_day):
+        result[('day', day_key_from_date(day))] = (orders, 0, 0)
+    rows = db.session.query(order_day, units, revenue)\
+        .join(OrderProducts, OrderProducts.order_id == Order.id)\
+        .group_by(order_day)
+    for day, day_units, day_revenue in rows:
+        orders = result.get(('day', day_key_from_date(day)), (0, 0, 0))[0]
+        result[('day', day_key_from_date(day))] = (orders, day_units, day_revenue)
+
+    rows = db.session.query(OrderProducts.product_id, units, revenue)\
+        .group_by(OrderProducts.product_id)
+    for product_id, product_units, product_revenue in rows:
+        result[('product', str(product_id))] = (0, product_units, product_revenue)
+
+    rows = db.session.query(OrderProducts.product_publisher, units, revenue)\
+        .group_by(OrderProducts.product_publisher)
+    for publisher, publisher_units, publisher_revenue in rows:
+        result[('publisher', publisher or '')] = (0, publisher_units, publisher_revenue)
+
+    for status, orders in db.session.query(Order.status, func.count(Order.id)).group_by(Order.status):
+        result[('status', status or '')] = (orders, 0, 0)
+    return result
+
+
+# func.date возвращает date в PostgreSQL и строку в SQLite
+def day_key_from_date(day):
+    if day is None:
+        return UNKNOWN_DAY
+    return day if isinstance(day, str) else day.isoformat()
+
+
+def stored_aggregates():
+    return {(row.kind, row.key): (row.orders, row.units, row.revenue)
+            for row in db.session.query(SalesAggregate.kind, SalesAggregate.key, SalesAggregate.orders,
+                                        SalesAggregate.units, SalesAggregate.revenue)}
+
+
+# Пересборка статистики по всем заказам в одной транзакции. В PostgreSQL таблица
+# статистики блокируется на время пересчета: заказы, оформленные в это время, дождутся
+# конца пересборки и прибавятся к уже пересчитанным данным, а не потеряются и не задвоятся
+def rebuild_aggregates():
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text('LOCK TABLE sales_aggregate IN EXCLUSIVE MODE'))
+
+    computed = compute_aggregates()
+    SalesAggregate.query.delete(synchronize_session=False)
+    if computed:
+        db.session.execute(SalesAggregate.__table__.insert(), [
+            {"kind": kind, "key": key, "orders": orders, "units": units, "revenue": revenue}
+            for (kind, key), (orders, units, revenue) in sorted(computed.items())])
+    db.session.commit()
+    return len(computed)
+
+
+# Сверка хранимой статистики с полным пересчетом. Возвращает список расхождений
+# (пустой, если все сходится). Строки с нулями считаются равными отсутствующим
+def check_aggregates():
+    computed = compute_aggregates()
+    stored = stored_aggregates()
+
+    mismatches = []
+    for kind, key in sorted(set(computed) | set(stored)):
+        expected = computed.get((kind, key), (0, 0, 0))
+        actual = stored.get((kind, key), (0, 0, 0))
+        if expected[0] != actual[0] or expected[1] != actual[1] \
+                or abs(expected[2] - actual[2]) > SALES_REVENUE_TOLERANCE:
+            mismatches.append({"kind": kind, "key": key,
+                               "expected": {"orders": expected[0], "units": expected[1], "revenue": expected[2]},
+                               "stored": {"orders": actual[0], "units": actual[1], "revenue": actual[2]}})
+    return mismatches
+
+
+# Отчет для админки: выручка и заказы по дням, самые продаваемые товары и издатели
+# (top штук), заказы по статусам. Читается только небольшая таблица статистики
+def sales_report(top=SALES_DEFAULT_TOP):
+    def rows(kind, order_by, limit=None):
+        query = db.session.query(SalesAggregate.key, SalesAggregate.orders, SalesAggregate.units,
+                                 SalesAggregate.revenue)\
+            .filter(SalesAggregate.kind == kind)\
+            .order_by(*order_by)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    best_sellers = [SalesAggregate.units.desc(), SalesAggregate.key]
+    return {
+        "days": [{"day": key, "orders": orders, "units": units, "revenue": round(revenue, 2)}
+                 for key, orders, units, revenue in rows('day', [SalesAggregate.key])],
+        "products": [{"product_id": int(key), "units": units, "revenue": round(revenue, 2)}
+                     for key, orders, units, revenue in rows('product', best_sellers, top)],
+        "publishers": [{"publisher": key, "units": units, "revenue": round(revenue, 2)}
+                       for key, orders, units, revenue in rows('publisher', best_sellers, top)],
+        "statuses": [{"status": key, "orders": orders}
+                     for key, orders, units, revenue in rows('status', [SalesAggregate.key]) if orders],
+    }
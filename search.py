@@ -0,0 +1,36 @@
+from sqlalchemy import func, or_
+
+from models import *
+
+# Ограничение на количество товаров в одной выдаче поиска
+SEARCH_DEFAULT_LIMIT = 50
+SEARCH_MAX_LIMIT = 200
+
+
+# Экранирование символов % и _, чтобы они искались как обычные символы
+def escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+# Поиск товаров по наименованию и издателю с ранжированием результатов.
+# В PostgreSQL поиск идет по триграммным GIN индексам (расширение pg_trgm):
+# такие индексы работают и для ILIKE '%текст%', и для нечеткого сравнения (оператор %),
+# поэтому находятся и слова с опечатками. Выше в выдаче товары, где текст входит в название,
+# затем - по похожести. В других базах (например, sqlite для разработки) - обычный ILIKE.
+# В query можно передать свой запрос, например, с выборкой только нужных колонок
+def search_products(tag, limit=SEARCH_DEFAULT_LIMIT, offset=0, query=None):
+    pattern = '%{}%'.format(escape_like(tag))
+    name_match = Product.name.ilike(pattern, escape='\\')
+    condition = or_(name_match, Product.publisher.ilike(pattern, escape='\\'))
+
+    if query is None:
+        query = Product.query
+    if db.engine.dialect.name == 'postgresql':
+        rank = func.greatest(func.similarity(Product.name, tag),
+                             func.similarity(Product.publisher, tag))
+        query = query.filter(or_(condition, Product.name.op('%')(tag), Product.publisher.op('%')(tag)))\
+            .order_by(name_match.desc(), rank.desc(), Product.id)
+    else:
+        query = query.filter(condition).order_by(name_match.desc(), Product.id)
+
+    return query.limit(limit).offset(offset).all()
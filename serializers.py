@@ -0,0 +1,64 @@
+import json
+
+from flask import current_app
+from marshmallow import fields
+
+from marsh_models import *
+
+try:
+    # orjson заметно быстрее стандартного json, но он необязателен
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Быстрое преобразование моделей в JSON для списков. Вместо загрузки ORM объектов
+# и обхода полей маршмеллоу на каждую запись, выбираются только нужные колонки в виде
+# кортежей, а словари собираются по заранее подготовленному списку полей.
+# Набор полей и формат значений берется из схемы маршмеллоу, поэтому результат
+# совпадает с результатом schema.dump
+class FastSchema:
+    def __init__(self, schema_class):
+        schema = schema_class()
+        model = schema.opts.model
+
+        self.fields = list(schema.dump_fields)
+        self.columns = [getattr(model, name) for name in self.fields]
+        # поля, которые маршмеллоу превращает в строки (даты) - для них нужен свой формат
+        self.converters = [(index, schema.dump_fields[name]._serialize)
+                           for index, name in enumerate(self.fields)
+                           if isinstance(schema.dump_fields[name], (fields.DateTime, fields.Date))]
+
+    # запрос только нужных колонок, к нему можно добавлять filter, order_by и т.д.
+    def query(self):
+        return db.session.query(*self.columns)
+
+    def dump(self, rows):
+        names = self.fields
+        if not self.converters:
+            return [dict(zip(names, row)) for row in rows]
+
+        result = []
+        for row in rows:
+            row = list(row)
+            for index, convert in self.converters:
+                row[index] = convert(row[index], None, None)
+            result.append(dict(zip(names, row)))
+        return result
+
+
+product_fast_schema = FastSchema(ProductJsonSchema)
+order_fast_schema = FastSchema(OrderJsonSchema)
+
+
+# Тело JSON ответа: компактно, в одну строку, ключи отсортированы, как во flask.
+# С orjson - быстрый путь, иначе стандартный json. Не jsonify: в режиме debug он
+# форматирует ответ в несколько строк, а построчная выдача (ndjson) должна оставаться построчной
+def json_bytes(data):
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS) + b'\n'
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode() + b'\n'
+
+
+def json_response(data, status=200):
+    return current_app.response_class(json_bytes(data), status=status, mimetype='application/json')
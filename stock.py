@@ -0,0 +1,28 @@
+from sqlalchemy import case
+
+from models import *
+
+# Сколько товаров можно изменить одним запросом
+STOCK_MAX_ITEMS = 1000
+
+
+# Изменение остатков сразу нескольких товаров одним UPDATE:
+# stockCount = stockCount + CASE id WHEN ... THEN delta END WHERE id IN (...).
+# deltas - словарь идентификатор товара -> на сколько изменить остаток.
+# Возвращает (новые остатки {id: stockCount}, None) или (None, текст ошибки);
+# при ошибке изменения откатываются. Коммит остается за вызывающим кодом
+def adjust_stock(deltas):
+    ids = list(deltas)
+    updated = Product.query.filter(Product.id.in_(ids))\
+        .update({Product.stockCount: Product.stockCount + case(deltas, value=Product.id, else_=0)},
+                synchronize_session=False)
+
+    levels = dict(db.session.query(Product.id, Product.stockCount).filter(Product.id.in_(ids)))
+    if updated != len(ids):
+        db.session.rollback()
+        return None, 'products not found: {}'.format(sorted(set(ids) - set(levels)))
+    if any(count < 0 for count in levels.values()):
+        db.session.rollback()
+        return None, 'stockCount can not be negative'
+
+    return levels, None